@@ -0,0 +1,141 @@
+# Koray Amico Kulbay, asyncio front-end of the network and Survey Matchmaking APIs
+
+# Package MatchService lets an asyncio application, such as a web service, match surveys and query a network
+# without blocking its event loop.
+#
+# Every request is put on a bounded queue and run in a thread, so a slow create_match doesn't stall other requests.
+# Concurrent requests for the same work share one computation, and when a queue is full new requests wait for
+# room instead of piling up. Network requests have their own queue and run one at a time on their own thread, since
+# a network must not be changed while it is searched, so they are never held up behind matching.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from network import Network
+from SurvMatch import MatchMake
+
+class MatchService:
+    """Asyncio front-end of a Network and MatchMake. Use as 'async with MatchService(net) as service:' or call
+    start and close. Parameter 'max_pending' is the number of match requests, and of network requests, queued before
+    new requests wait, 'workers' the number of threads running create_match."""
+    def __init__(self, network=None, max_pending=64, workers=1):
+        if network is None:
+            network = Network()
+        if type(network) is not Network:
+            raise TypeError("Wrong datatype: network has to be of custom type Network!")
+        if type(max_pending) is not int or max_pending < 1 or type(workers) is not int or workers < 1:
+            raise ValueError("max_pending and workers must be positive integers!")
+        self.network = network
+        self._max_pending = max_pending
+        self._workers = workers
+        self._queue = None  # asyncio.Queue of create_match requests, made by start in the running event loop
+        self._network_queue = None  # asyncio.Queue of network requests
+        self._consumers = []
+        self._in_flight = {}  # Key of request -> future of its result, shared by equal requests
+        self._executor = None
+        self._network_executor = None
+        self._requests = 0
+        self._coalesced = 0
+
+    async def start(self):
+        """Starts the threads and the tasks running queued requests."""
+        if self._queue is not None:
+            raise RuntimeError("Service is already started!")
+        self._queue = asyncio.Queue(self._max_pending)
+        self._network_queue = asyncio.Queue(self._max_pending)
+        self._executor = ThreadPoolExecutor(self._workers)
+        self._network_executor = ThreadPoolExecutor(1)  # A network is only used by one thread at a time
+        self._consumers = [asyncio.create_task(self._consume(self._queue, self._executor))
+                           for _ in range(self._workers)]
+        self._consumers.append(asyncio.create_task(self._consume(self._network_queue, self._network_executor)))
+
+    async def close(self):
+        """Waits for queued requests to finish, then stops the service."""
+        if self._queue is None:
+            return
+        await self._queue.join()
+        await self._network_queue.join()
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._executor.shutdown()
+        self._network_executor.shutdown()
+        self._queue = None
+        self._network_queue = None
+        self._consumers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def create_match(self, source, target_list, **options):
+        """Returns a new MatchMake of source matched to target_list, see MatchMake.create_match for the options.
+        Concurrent calls with the same source, target_list and options share one match."""
+        key = ("create_match", id(source), id(target_list), tuple(sorted(options.items())))
+        return await self._submit(key, self._queue, _create_match, source, target_list, options)
+
+    async def match_fill(self, MatchMake_inst, **options):
+        """Fills the network of the service from MatchMake_inst, see Network.match_fill for the options."""
+        key = ("match_fill", id(MatchMake_inst), tuple(sorted(options.items())))
+        return await self._submit(key, self._network_queue, _match_fill, self.network, MatchMake_inst, options)
+
+    async def collect(self, source, distance):
+        """Returns a list of all members of the network 'distance' steps from member source, see Network.collect.
+        Concurrent calls with the same source and distance share one list."""
+        key = ("collect", source, distance)
+        return await self._submit(key, self._network_queue, self.network.collect, source, distance)
+
+    def info(self):
+        """Returns statistics of the service as a dict. {requests,coalesced,pending,in_flight}."""
+        pending = self._queue.qsize() + self._network_queue.qsize() if self._queue is not None else 0
+        return {"requests": self._requests, "coalesced": self._coalesced, "pending": pending,
+                "in_flight": len(self._in_flight)}
+
+    async def _submit(self, key, queue, function, *args):
+        """Queues function(*args) on queue, or joins the request with the same key already queued or running. Waits
+        while the queue is full."""
+        if queue is None:
+            raise RuntimeError("Service is not started!")
+        self._requests += 1
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                await queue.put((key, function, args, future))
+            except BaseException:
+                del self._in_flight[key]
+                future.cancel()
+                raise
+        else:
+            self._coalesced += 1
+        return await asyncio.shield(future)  # A cancelled caller doesn't cancel the request of the others
+
+    async def _consume(self, queue, executor):
+        """Runs requests of queue in executor one at a time, setting the result or exception of their future."""
+        loop = asyncio.get_running_loop()
+        while True:
+            key, function, args, future = await queue.get()
+            try:
+                result = await loop.run_in_executor(executor, function, *args)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                del self._in_flight[key]
+                queue.task_done()
+
+def _create_match(source, target_list, options):
+    """Returns a new MatchMake of source matched to target_list."""
+    match = MatchMake()
+    match.create_match(source, target_list, **options)
+    return match
+
+def _match_fill(network, MatchMake_inst, options):
+    """Fills network from MatchMake_inst."""
+    network.match_fill(MatchMake_inst, **options)
@@ -0,0 +1,104 @@
+# Koray Amico Kulbay, asyncio front-end, load test
+
+import asyncio
+import json
+from random import Random
+from time import perf_counter
+from MatchService import MatchService
+from SurvMatch import MatchMake, SurveySchema
+from SurvMatch_bench import make_surveys
+from network_bench import random_network
+
+def percentile(values, share):
+    """Returns the value below which 'share' of sorted values lie."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+async def run_server(answer):
+    """Starts a local line based server answering each request line with the JSON of await answer(words)."""
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                reply = await answer(line.decode().split())
+            except (NameError, ValueError) as error:
+                reply = {"error": str(error)}
+            writer.write((json.dumps(reply) + "\n").encode())
+            await writer.drain()
+        writer.close()
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+async def client(port, requests, latencies):
+    """Sends requests one at a time over one connection, appending [kind, seconds] of each to latencies."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for request in requests:
+        start = perf_counter()
+        writer.write((" ".join(map(str, request)) + "\n").encode())
+        await writer.drain()
+        await reader.readline()
+        latencies.append([request[0], perf_counter() - start])
+    writer.close()
+    await writer.wait_closed()
+
+async def load_test(service_mode, net, surveys, clients, requests, seed):
+    """Runs clients against a server answering in the event loop or through a MatchService."""
+    rng = Random(seed)
+    service = MatchService(net) if service_mode else None
+    targets = surveys[1:]
+
+    async def answer(words):
+        if words[0] == "collect":
+            if service_mode:
+                return await service.collect(int(words[1]), int(words[2]))
+            return net.collect(int(words[1]), int(words[2]))
+        source = surveys[int(words[1])]
+        if service_mode:
+            match = await service.create_match(source, targets, k=10)
+        else:
+            match = MatchMake()
+            match.create_match(source, targets, k=10)
+        return [inst.match_target for inst in match._score_list]
+
+    if service_mode:
+        await service.start()
+    server = await run_server(answer)
+    port = server.sockets[0].getsockname()[1]
+    latencies = []
+    plans = []
+    for i in range(clients):
+        if i < 2:  # Two clients ask for heavy matches of different sources at once, the others for collects
+            plans.append([["match", i]] * max(1, requests // 20))
+        else:
+            plans.append([["collect", rng.randrange(1000), rng.randint(0, 2)] for _ in range(requests)])
+    start = perf_counter()
+    await asyncio.gather(*[client(port, plan, latencies) for plan in plans])
+    elapsed = perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    if service_mode:
+        await service.close()
+    return latencies, elapsed
+
+def bench_latency(size=100_000, respondents=20_000, clients=16, requests=200, seed=0):
+    """Load test of a local server with two clients asking for create_match and the rest for collect, answered
+    blocking in the event loop versus through MatchService. Prints p50 and p99 latency of collect."""
+    net = random_network(size, seed)
+    surveys = make_surveys(respondents, 50, schema=SurveySchema())
+    results = []
+    for service_mode in (False, True):
+        latencies, elapsed = asyncio.run(load_test(service_mode, net, surveys, clients, requests, seed))
+        collects = [seconds for kind, seconds in latencies if kind == "collect"]
+        p50 = percentile(collects, 0.5)
+        p99 = percentile(collects, 0.99)
+        results.append([service_mode, p50, p99, elapsed])
+        print("collect latency with", clients, "clients, MatchService =", service_mode, ": p50",
+              round(p50 * 1e3, 2), "ms, p99", round(p99 * 1e3, 2), "ms, total", round(elapsed, 3), "s")
+    return results
+
+def main():
+    bench_latency()
+
+
+if __name__ == '__main__': main()
@@ -0,0 +1,77 @@
+# Koray Amico Kulbay, asyncio front-end, unit test
+
+import asyncio
+from MatchService import MatchService
+from network import Network
+from SurvMatch import SurveyRes, MatchMake
+
+async def scenario():
+    """Unit testing inside a running event loop."""
+    net = Network.from_edges([[0, 1], [1, 2], [2, 3], [1, 4]])
+    service = MatchService(net, max_pending=2)
+    try:
+        await service.collect(0, 1)
+        assert False
+    except RuntimeError:
+        pass
+
+    async with service:
+        # Concurrent equal requests share one computation
+        results = await asyncio.gather(*[service.collect(0, 2) for _ in range(10)])
+        assert results == [[2, 4]] * 10
+        assert service.info()["coalesced"] == 9
+        assert net.cache_info()["misses"] == 1
+
+        # More requests than fit in the queue wait for room and all finish
+        results = await asyncio.gather(*[service.collect(source, 1) for source in [0, 1, 2, 3, 4] * 4])
+        assert results == [net.collect(source, 1) for source in [0, 1, 2, 3, 4]] * 4
+        assert service.info()["pending"] == 0 and service.info()["in_flight"] == 0
+
+        # Errors reach every caller
+        for call in (service.collect(9, 1), service.collect(0, 7)):
+            try:
+                await call
+                assert False
+            except (NameError, ValueError):
+                pass
+
+        # Matching and filling the network give the same result as the blocking calls
+        surveys = [SurveyRes(name) for name in ["Pat.", "Th1.", "Th2.", "Th3."]]
+        for i, surv in enumerate(surveys):
+            surv.add("quest1", i % 2, 5)
+            surv.add("quest2", i % 3, 2)
+        targets = surveys[1:]
+        match, same = await asyncio.gather(service.create_match(surveys[0], targets, k=2),
+                                           service.create_match(surveys[0], targets, k=2))
+        assert match is same
+        expected = MatchMake()
+        expected.create_match(surveys[0], surveys[1:], k=2)
+        assert [[m.match_target, m.match_score] for m in match._score_list] == \
+               [[m.match_target, m.match_score] for m in expected._score_list]
+        await service.match_fill(match)
+        assert await service.collect("Pat.", 1) == [expected._score_list[0].match_target]
+    assert service.info()["requests"] == 36
+
+    # Network requests don't wait behind create_match calls taking every worker
+    big = [SurveyRes(i) for i in range(20_000)]
+    for i, surv in enumerate(big):
+        for quest in range(10):
+            surv.add(quest, (i * 7 + quest) % 3, 1)
+    async with MatchService(net, workers=1) as service:
+        done = []
+
+        async def timed(name, call):
+            await call
+            done.append(name)
+
+        await asyncio.gather(timed("match", service.create_match(big[0], big[1:])),
+                             timed("match", service.create_match(big[1], big[2:])),
+                             timed("collect", service.collect(0, 1)))
+        assert done[0] == "collect"
+
+def main():
+    """Unit testing."""
+    asyncio.run(scenario())
+
+
+if __name__ == '__main__': main()
@@ -9,20 +9,134 @@
 # respondent (id of who/what answered survey) easily accessible. Answers are stored in array format.
 # By gathering instances of SurveyRes one can use MatchMake to handle matches between different surveys.
 
+import os
+from array import array
+from heapq import heappush, heappushpop
+
+# Modules only some methods need (numpy, csv, json, concurrent.futures) are imported by those methods on first use,
+# so importing SurvMatch stays fast for processes that only build and match surveys.
+np = None  # numpy once imported by _numpy, it is optional and only the vectorized paths and persistence need it
+
+def _numpy(purpose):
+    """Returns numpy, importing it on first use. Raises ImportError saying numpy is required 'purpose' if it isn't
+    installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("numpy is required " + purpose + ".") from None
+        np = numpy
+    return np
+
 
 class _QuestRes:
     """Question Result: Answer to specific question in survey and its match value."""
+    __slots__ = ("alias", "answer", "match_value")
+
     def __init__(self,question,answer,match_value):
         self.alias = question
         self.answer = answer
         self.match_value = match_value
 
+class SurveySchema:
+    """Question layout shared by surveys of the same questionnaire. Each question gets a column, its match_value
+    and the distinct answers to it are stored once here instead of once per survey.
+    Answers are validated against the schema when added to a bound SurveyRes, so MatchMake can skip the per-pair
+    checks between surveys sharing a schema. If parameter 'strict' = True only questions added to the schema
+    are accepted, otherwise unknown questions are added on first use."""
+    def __init__(self,strict=False):
+        self._strict = strict
+        self._columns = {}  # question -> column index
+        self._questions = []  # column index -> question
+        self._match_values = []  # column index -> match_value
+        self._codebooks = []  # column index -> {answer: code}
+        self._answers = []  # column index -> list of answers, indexed by code
+        self._closed = []  # column index -> True if only the answers already in codebook are allowed
+
+    def add(self,question,match_value,answers=None):
+        """Adds question with its match_value to schema. If a list of allowed answers is given, any other answer
+        to the question is rejected."""
+        if type(match_value) == int or type(match_value) == float:
+            pass
+        else:
+            raise ValueError("Wrong datatype: match_value needs to be int or float! ")
+
+        if type(question) == int or type(question) == float or type(question) == str:
+            pass
+        else:
+            raise ValueError("Wrong datatype: question needs to be int,float or str! ")
+
+        if answers is not None and type(answers) != list:
+            raise TypeError("Wrong datatype for answers, input needs to be a list.")
+
+        if question in self._columns:
+            raise NameError("Question already exists!")
+
+        column = self._new_column(question,match_value)
+        if answers is not None:
+            for answer in answers:
+                self._code(column,answer)
+            self._closed[column] = True
+
+    def len(self):
+        """Returns number of questions in schema."""
+        return len(self._questions)
+
+    def get(self,question):
+        """Returns specific question as a list. [question,match_value,answers]."""
+        column = self._columns.get(question)
+        if column is None:
+            raise NameError("No such question exists in schema!")
+        return [question, self._match_values[column], list(self._answers[column])]
+
+    def _new_column(self,question,match_value):
+        """Appends a column for question and returns its index."""
+        column = self._columns[question] = len(self._questions)
+        self._questions.append(question)
+        self._match_values.append(match_value)
+        self._codebooks.append({})
+        self._answers.append([])
+        self._closed.append(False)
+        return column
+
+    def _column(self,question,match_value):
+        """Returns column of question, adding it if new and schema isn't strict.
+        Raises NameError if question is unknown to a strict schema or match_value differs from the stored."""
+        column = self._columns.get(question)
+        if column is None:
+            if self._strict:
+                raise NameError("No such question exists in schema!")
+            column = self._new_column(question,match_value)
+        elif self._match_values[column] != match_value:
+            raise NameError("Question match_value doesn't match schema!")
+        return column
+
+    def _code(self,column,answer):
+        """Returns integer code of answer to question in column, adding it if new.
+        Raises ValueError if the question only allows the answers given to add."""
+        codebook = self._codebooks[column]
+        code = codebook.get(answer)
+        if code is None:
+            if self._closed[column]:
+                raise ValueError("Answer not allowed for question in schema!")
+            code = codebook[answer] = len(codebook)
+            self._answers[column].append(answer)
+        return code
+
 class SurveyRes:
-    """Survey Results: containing respondent id and answers of questions in external survey."""
-    def __init__(self,respondent):
+    """Survey Results: containing respondent id and answers of questions in external survey.
+    If a SurveySchema is given, answers are stored as a typed array of answer codes, one per schema column."""
+    __slots__ = ("_respondent", "_answer_list", "_size", "_schema", "_codes")
+
+    def __init__(self,respondent,schema=None):
+        if schema is not None and type(schema) is not SurveySchema:
+            raise TypeError("Wrong datatype: schema has to be of custom type SurveySchema!")
         self._respondent = respondent
-        self._answer_list = None  # list of instances of _QuestRes
+        self._answer_list = None  # list of instances of _QuestRes, unused when bound to a schema
         self._size = 0
+        self._schema = schema
+        self._codes = array("i") if schema is not None else None  # answer code per schema column, -1 if unanswered
 
     def add(self,question,answer,match_value):
         """Adds result of one question to answer_list in Survey Results."""
@@ -35,6 +149,14 @@ class SurveyRes:
             pass
         else:
             raise ValueError("Wrong datatype: question needs to be int,float or str! ")
+        self.unchecked_add(question,answer,match_value)
+
+    def unchecked_add(self,question,answer,match_value):
+        """Adds result of one question like add, without checking the datatypes of question and match_value.
+        Only for bulk data already validated, duplicate questions and schema mismatches are still rejected."""
+        if self._schema is not None:
+            self._add_coded(question,answer,match_value)
+            return
 
         if self._answer_list is None:
             self._answer_list = []
@@ -45,11 +167,27 @@ class SurveyRes:
         self._answer_list.append(_QuestRes(question,answer,match_value))
         self._size += 1
 
+    def _add_coded(self,question,answer,match_value):
+        """Stores answer as a code in the schema column of question."""
+        if self._get(question):
+            raise NameError("Question already exists!")
+        column = self._schema._column(question,match_value)
+        code = self._schema._code(column,answer)
+        codes = self._codes
+        if len(codes) <= column:
+            codes.extend([-1] * (self._schema.len() - len(codes)))
+        codes[column] = code
+        self._size += 1
+
     def remove(self,question):
         """Removes result of one question in Survey Results.
         Slow, try do avoid. N = #questions, N worst case time complexity. """
         quest = self._get(question)
         if quest:
+            if self._schema is not None:
+                self._codes[self._schema._columns[question]] = -1
+                self._size -= 1
+                return
             self._answer_list.remove(quest)
             self._size -= 1
             if len(self._answer_list) == 0:
@@ -71,31 +209,56 @@ class SurveyRes:
 
     def _get(self,question):
         """Returns None if question doesn't exists."""
+        if self._schema is not None:
+            column = self._schema._columns.get(question)
+            if column is not None and column < len(self._codes) and self._codes[column] != -1:
+                return _QuestRes(question, self._schema._answers[column][self._codes[column]],
+                                 self._schema._match_values[column])
+            return None
         if self._answer_list:
             for quest in self._answer_list:  # Slow here
                 if quest.alias == question:
                     return quest
 
+    def _results(self):
+        """Returns list of _QuestRes of all answered questions, or None if there are none."""
+        if self._schema is None:
+            return self._answer_list
+        schema = self._schema
+        results = []
+        for column, code in enumerate(self._codes):
+            if code != -1:
+                results.append(_QuestRes(schema._questions[column], schema._answers[column][code],
+                                         schema._match_values[column]))
+        return results or None
+
     def clear(self):
         """Clears survey of all question results."""
         self._answer_list = None
         self._size = 0
+        if self._schema is not None:
+            self._codes = array("i")
 
     def display(self):
         """Graphical representation of survey."""
         print(self._respondent)
-        if self._answer_list:
-            for quest in self._answer_list:
+        answer_list = self._results()
+        if answer_list:
+            for quest in answer_list:
                 print(self.get(quest.alias))
         else:
-            print(self._answer_list)  # will be None
+            print(answer_list)  # will be None
 
 class _MatchInstance:
     """A MatchMake element with comparison result of Survey Results from two respondents."""
+    __slots__ = ("match_source", "match_target", "match_score", "raw_score", "max_score")
+
     def __init__(self,source,target):
         self.match_source = source  # alias/name
         self.match_target = target  # alias/name
         self.match_score = 0
+        self.raw_score = 0  # Sum of match_values of equal answers, match_score = raw_score/max_score
+        self.max_score = 0  # Sum of match_values of questions of source
 
 class MatchMake(SurveyRes):
     """Platform to handle matchmaking of survey results (SurveyRes) before creating network where each respondent will
@@ -103,26 +266,59 @@ class MatchMake(SurveyRes):
     def __init__(self):
         self._source = None
         self._score_list = []  # List consisting of elements of _MatchInstance
+        self._source_survey = None  # SurveyRes of source, kept for update
+        self._target_surveys = []  # SurveyRes of the target of each element of _score_list
+        self._target_rows = None  # id of target SurveyRes -> indexes in _score_list, made on first update
 
-    def create_match(self,source, target_list):
+    def create_match(self,source, target_list, vectorized=False, workers=None, chunk_size=None, k=None,
+                     min_score=None):
         """Returns a match between a source survey and one or more target surveys.
-        Beware, slow! N = #questions, M = #target surveys:  M*N^2 worst case time complexity."""
+        Beware, slow! N = #questions, M = #target surveys:  M*N^2 worst case time complexity.
+        If parameter 'vectorized' = True all targets are scored at once with numpy, M*N time complexity.
+        If parameter 'workers' is given, target_list is split in chunks of 'chunk_size' targets scored by a pool of
+        that many processes.
+        If parameter 'k' or 'min_score' is given, only the k best targets with a score of at least min_score are
+        kept, sorted by score. Targets are then dropped once they can't reach the k:th best score, checked every
+        few questions, see _create_match_top."""
         if type(source) is SurveyRes and type(target_list) is list:
             pass
         else:
             raise TypeError("Wrong datatype: source has to be of custom type SurveyRes and target_list a list!")
+        if k is not None and (type(k) is not int or k < 1):
+            raise ValueError("k must be a positive integer!")
+        if min_score is not None and type(min_score) not in (int, float):
+            raise ValueError("min_score must be a number!")
 
         self._source = source._respondent
+        if type(self._score_list) is not list:  # A loaded result is read-only until matched again
+            self._score_list = list(self._score_list)
+            self._target_surveys = [None] * len(self._score_list)
+        self._source_survey = source
+        self._target_rows = None
+        if (k is not None or min_score is not None) and not vectorized and workers is None:
+            self._create_match_top(source, target_list, k, min_score)
+            return
+        if source._schema is not None and not vectorized and workers is None:
+            if all(type(target) is SurveyRes and target._schema is source._schema for target in target_list):
+                self._create_match_schema(source, target_list)
+                return
+        if workers is not None:
+            if vectorized:
+                raise ValueError("Choose either vectorized or workers, not both!")
+            self._create_match_parallel(source, target_list, workers, chunk_size, k, min_score)
+            return
+        if vectorized:
+            self._create_match_vectorized(source, target_list, k, min_score)
+            return
         for target in target_list:
 
             if type(target) is not SurveyRes:
                 raise TypeError("Wrong datatype: ALL elements of target_list has to be of custom type SurveyRes!)")
 
 
-            match = _MatchInstance(source._respondent,target._respondent)  # Score is now zero
-            self._score_list.append(match)
+            match_score = 0
             max_score = 0
-            for quest_res in source._answer_list:
+            for quest_res in source._results():
                 target_res = target._get(quest_res.alias)
                 if target_res is None:
                     raise NameError("Questions in source and target survey doesn't match!")
@@ -131,12 +327,730 @@ class MatchMake(SurveyRes):
                     if quest_res.match_value != target_res.match_value:
                         raise NameError("Question match_value doesn't match between source and target survey!")
                     else:
-                        match.match_score += quest_res.match_value
-            match.match_score = match.match_score/max_score  # Creates a percentage of maxscore
+                        match_score += quest_res.match_value
+            self._add_match(source, target, match_score, max_score)
+
+    def _create_match_schema(self, source, target_list):
+        """Scores targets bound to the same SurveySchema as source directly on their answer codes.
+        Questions and match_values were validated by the schema when added, so only unanswered questions are checked."""
+        schema = source._schema
+        src_columns = []
+        max_score = 0
+        for column, code in enumerate(source._codes):
+            if code != -1:
+                match_value = schema._match_values[column]
+                src_columns.append((column, code, match_value))
+                max_score += match_value
+
+        for target in target_list:
+            match_score = 0
+            codes = target._codes
+            answered = len(codes)
+            for column, code, match_value in src_columns:
+                if column >= answered or codes[column] == -1:
+                    raise NameError("Questions in source and target survey doesn't match!")
+                if codes[column] == code:
+                    match_score += match_value
+            self._add_match(source, target, match_score, max_score)
+
+    def _create_match_top(self, source, target_list, k, min_score):
+        """Scores targets one at a time keeping the k best, tied scores in target_list order, in a min-heap.
+        Questions are compared in descending match_value, in segments of _BOUND_EVERY questions, and a target is
+        dropped after a segment once its score plus the positive match_values of its remaining questions falls
+        below the k:th best score or min_score. Nothing is dropped if the sum of match_values isn't positive, as a
+        higher raw score then gives a lower match_score. Unless every match_value is an int, scores of targets that
+        can enter the heap are summed again in question order, so they equal those of create_match.
+        Beware, the remaining questions of a dropped target are not checked against the source."""
+        schema = source._schema
+        if schema is not None and all(type(target) is SurveyRes and target._schema is schema
+                                      for target in target_list):
+            questions = [(column, code, schema._match_values[column])
+                         for column, code in enumerate(source._codes) if code != -1]
+        else:
+            schema = None
+            questions = [(quest_res.alias, quest_res.answer, quest_res.match_value)
+                         for quest_res in source._results() or ()]
+        max_score = 0
+        for _, _, match_value in questions:
+            max_score += match_value
+        exact = all(type(match_value) is int for _, _, match_value in questions)  # Sums equal in any order
+        ordered = sorted(questions, key=lambda question: -question[2])
+        segments = []  # [questions,most a target can still gain after them] in descending match_value
+        rest = 0
+        for _, _, match_value in ordered:
+            rest += max(match_value, 0)
+        for start in range(0, len(ordered), _BOUND_EVERY):
+            segment = ordered[start:start + _BOUND_EVERY]
+            for _, _, match_value in segment:
+                rest -= max(match_value, 0)
+            segments.append((segment, rest))
+        margin = 0 if exact else 1e-9 * abs(max_score)  # Bounds are summed in another order than the exact scores
+        prune = max_score > 0
+        floor = float("-inf") if min_score is None or not prune else min_score * max_score
+        last = max([column for column, _, _ in questions]) if schema is not None and questions else -1
+
+        heap = []  # Min-heap of (score, -target index, raw score), the worst kept match on top
+        for index, target in enumerate(target_list):
+            if type(target) is not SurveyRes:
+                raise TypeError("Wrong datatype: ALL elements of target_list has to be of custom type SurveyRes!)")
+            bound = floor
+            if prune and k is not None and len(heap) == k and heap[0][0] * max_score > bound:
+                bound = heap[0][0] * max_score
+            bound -= margin
+
+            score = 0
+            if schema is not None:
+                codes = target._codes
+                if len(codes) <= last:
+                    raise NameError("Questions in source and target survey doesn't match!")
+                for segment, rest in segments:
+                    for column, code, match_value in segment:
+                        target_code = codes[column]
+                        if target_code == code:
+                            score += match_value
+                        elif target_code == -1:
+                            raise NameError("Questions in source and target survey doesn't match!")
+                    if score + rest < bound:
+                        break
+                else:
+                    if not exact:
+                        score = 0
+                        for column, code, match_value in questions:
+                            if codes[column] == code:
+                                score += match_value
+                    self._push_top(heap, k, score/max_score, index, min_score, score)
+            else:
+                for segment, rest in segments:
+                    for alias, answer, match_value in segment:
+                        target_res = target._get(alias)
+                        if target_res is None:
+                            raise NameError("Questions in source and target survey doesn't match!")
+                        if target_res.answer == answer:
+                            if match_value != target_res.match_value:
+                                raise NameError("Question match_value doesn't match between source and target "
+                                                "survey!")
+                            score += match_value
+                    if score + rest < bound:
+                        break
+                else:
+                    if not exact:
+                        score = 0
+                        for alias, answer, match_value in questions:
+                            if target._get(alias).answer == answer:
+                                score += match_value
+                    self._push_top(heap, k, score/max_score, index, min_score, score)
+
+        self._add_heap(source, target_list, heap, max_score)
+
+    @staticmethod
+    def _push_top(heap, k, score, index, min_score, raw_score):
+        """Adds score of target index to heap if it is at least min_score and among the k best."""
+        if min_score is not None and score < min_score:
+            return
+        item = (score, -index, raw_score)
+        if k is None or len(heap) < k:
+            heappush(heap, item)
+        elif item > heap[0]:
+            heappushpop(heap, item)
+
+    def _add_heap(self, source, target_list, heap, max_score):
+        """Adds a match per target kept in heap by _push_top, best score first."""
+        for _, neg_index, raw_score in sorted(heap, reverse=True):
+            self._add_match(source, target_list[-neg_index], raw_score, max_score)
+
+    def _add_scores(self, source, target_list, raw_scores, max_score, k=None, min_score=None):
+        """Adds a match per target with its score, or only the k best with a score of at least min_score."""
+        if k is None and min_score is None:
+            for target, raw_score in zip(target_list, raw_scores):
+                self._add_match(source, target, raw_score, max_score)
+            return
+        heap = []
+        for index, raw_score in enumerate(raw_scores):
+            self._push_top(heap, k, raw_score/max_score, index, min_score, raw_score)
+        self._add_heap(source, target_list, heap, max_score)
+
+    def _add_match(self, source, target, raw_score, max_score):
+        """Adds the match of source and target with the sum of match_values of their equal answers."""
+        match = _MatchInstance(source._respondent, target._respondent)
+        match.raw_score = raw_score
+        match.max_score = max_score
+        match.match_score = raw_score/max_score  # Creates a percentage of maxscore
+        self._score_list.append(match)
+        self._target_surveys.append(target)
+
+    def _create_match_vectorized(self, source, target_list, k=None, min_score=None):
+        """Scores every target in one weighted equality-and-reduce over integer coded answers.
+        Raises the same errors as the loop in create_match, but before any match is added."""
+        for target in target_list:
+            if type(target) is not SurveyRes:
+                raise TypeError("Wrong datatype: ALL elements of target_list has to be of custom type SurveyRes!)")
+
+        questions, src_codes, codes, weights = _encode(source, target_list)
+        src_weights = np.array([quest_res.match_value for quest_res in questions], dtype=np.float64)
+        equal = codes == src_codes
+        if (equal & (weights != src_weights)).any():
+            raise NameError("Question match_value doesn't match between source and target survey!")
+
+        # Columns are added one at a time, in question order, so the float sums equal those of the loop
+        scores = np.zeros(len(target_list), dtype=np.float64)
+        for column in range(len(src_weights)):
+            scores += np.where(equal[:, column], src_weights[column], 0.0)
+
+        max_score = 0
+        for quest_res in questions:
+            max_score += quest_res.match_value
+        self._add_scores(source, target_list, scores.tolist(), max_score, k, min_score)
+
+    def _create_match_parallel(self, source, target_list, workers, chunk_size, k=None, min_score=None):
+        """Scores chunks of target_list in a process pool. Surveys are sent as tuples of plain values.
+        Raises the same errors as the loop in create_match, but before any match is added."""
+        if type(workers) is not int or workers < 1:
+            raise ValueError("workers must be a positive integer!")
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(target_list) // (workers * 4)))  # About four chunks per worker
+        elif type(chunk_size) is not int or chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer!")
+
+        for target in target_list:
+            if type(target) is not SurveyRes:
+                raise TypeError("Wrong datatype: ALL elements of target_list has to be of custom type SurveyRes!)")
+
+        packed_source = _pack(source)
+        chunks = []
+        for start in range(0, len(target_list), chunk_size):
+            chunks.append([_pack(target) for target in target_list[start:start + chunk_size]])
+
+        from concurrent.futures import ProcessPoolExecutor
+        scores = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_scores in executor.map(_score_chunk, [packed_source] * len(chunks), chunks):
+                scores.extend(chunk_scores)
+
+        max_score = 0
+        for match_value in packed_source[3]:
+            max_score += match_value
+        self._add_scores(source, target_list, scores, max_score, k, min_score)  # map keeps order of target_list
+
+    def update(self,survey,question,answer,match_value=None):
+        """Changes the answer to question of survey, the source or a target of the latest create_match, and adjusts
+        the match_score of the matches it is part of by the question's match_value instead of matching again.
+        If parameter 'match_value' = None the match_value of the question is kept.
+        Matches kept by k or min_score are not selected or sorted again."""
+        if type(survey) is not SurveyRes:
+            raise TypeError("Wrong datatype: survey has to be of custom type SurveyRes!")
+        if self._source_survey is None:
+            raise NameError("No matched surveys to update!")
+        old = survey._get(question)
+        if old is None:
+            raise NameError("No such question exists in survey!")
+        if match_value is None:
+            match_value = old.match_value
+
+        if survey is self._source_survey:
+            rows = [row for row, match in enumerate(self._score_list)
+                    if self._target_surveys[row] is not None and match.match_source == survey._respondent]
+            changes = []
+            for row in rows:
+                target_res = self._target_surveys[row]._get(question)
+                if target_res is None:
+                    raise NameError("Questions in source and target survey doesn't match!")
+                if target_res.answer == answer and target_res.match_value != match_value:
+                    raise NameError("Question match_value doesn't match between source and target survey!")
+                change = (match_value if target_res.answer == answer else 0) - \
+                         (old.match_value if target_res.answer == old.answer else 0)
+                changes.append(change)
+            max_change = match_value - old.match_value
+        else:
+            if self._target_rows is None:  # Only rows matched against the current source, as in the source branch
+                self._target_rows = {}
+                source = self._source_survey._respondent
+                for row, target in enumerate(self._target_surveys):
+                    if target is not None and self._score_list[row].match_source == source:
+                        self._target_rows.setdefault(id(target), []).append(row)
+            rows = self._target_rows.get(id(survey))
+            if rows is None:
+                raise NameError("Survey is not part of match!")
+            source_res = self._source_survey._get(question)
+            if source_res is None:  # Questions only answered by the target don't count
+                change = 0
+            else:
+                if source_res.answer == answer and source_res.match_value != match_value:
+                    raise NameError("Question match_value doesn't match between source and target survey!")
+                change = (source_res.match_value if source_res.answer == answer else 0) - \
+                         (source_res.match_value if source_res.answer == old.answer else 0)
+            changes = [change] * len(rows)
+            max_change = 0
+
+        survey.remove(question)
+        try:
+            survey.add(question, answer, match_value)
+        except (TypeError, NameError, ValueError):
+            survey.add(question, old.answer, old.match_value)  # Leaves survey unchanged
+            raise
+        for row, change in zip(rows, changes):
+            match = self._score_list[row]
+            match.raw_score += change
+            match.max_score += max_change
+            match.match_score = match.raw_score/match.max_score  # Creates a percentage of maxscore
+
+    @classmethod
+    def match_all(cls, survey_list, k=10, block_size=1024):
+        """Matches every survey in survey_list against every other one and returns a list of MatchMake, one per
+        source survey in the same order, each holding only the k best targets sorted by score.
+        Scores are computed in blocks of block_size x block_size pairs, so the full N x N score matrix is never
+        stored. Every result can be given to match_fill of a Network. N = #surveys, Q = #questions:  N^2*Q work."""
+        if type(survey_list) is not list:
+            raise TypeError("Wrong datatype: survey_list has to be a list!")
+        for survey in survey_list:
+            if type(survey) is not SurveyRes:
+                raise TypeError("Wrong datatype: ALL elements of survey_list has to be of custom type SurveyRes!)")
+        if type(k) is not int or k < 1 or type(block_size) is not int or block_size < 1:
+            raise ValueError("k and block_size must be positive integers!")
+
+        results = []
+        for survey in survey_list:
+            match = cls()
+            match._source = survey._respondent
+            match._source_survey = survey
+            results.append(match)
+        if len(survey_list) < 2:
+            return results
+
+        questions, _, codes, weights = _encode(survey_list[0], survey_list)
+        for survey in survey_list:
+            if survey.len() != len(questions):
+                raise NameError("Questions in source and target survey doesn't match!")
+        for column in range(len(questions)):  # Equal answers to a question must share match_value
+            order = np.argsort(codes[:, column], kind="stable")
+            col_codes = codes[order, column]
+            col_weights = weights[order, column]
+            if ((col_codes[1:] == col_codes[:-1]) & (col_weights[1:] != col_weights[:-1])).any():
+                raise NameError("Question match_value doesn't match between source and target survey!")
+        schema = survey_list[0]._schema
+        if schema is not None and all(survey._schema is schema for survey in survey_list):
+            orders = None  # create_match sums surveys sharing a schema in column order, the order of codes
+        else:  # create_match sums in the order questions were added to the source, columns of codes in that order
+            position = {quest_res.alias: column for column, quest_res in enumerate(questions)}
+            orders = [tuple([position[quest_res.alias] for quest_res in survey._results()]) for survey in survey_list]
+
+        size = len(survey_list)
+        max_scores = []  # Sum of match_values of each source, targets are ranked by raw score / max_score
+        for survey in survey_list:
+            max_score = 0
+            for quest_res in survey._results():
+                max_score += quest_res.match_value
+            if max_score == 0:
+                raise ZeroDivisionError("float division by zero")  # As create_match dividing by it
+            max_scores.append(max_score)
+        heaps = [[] for _ in range(size)]  # Min-heaps of (score, -target index, raw score), the worst kept on top
+        for src_start in range(0, size, block_size):
+            src_stop = min(src_start + block_size, size)
+            src_codes = codes[src_start:src_stop]
+            src_weights = weights[src_start:src_stop]
+            if orders is None:
+                groups = [[range(len(questions)), slice(None)]]
+            else:  # Sources of the block grouped by question order, usually all share one
+                by_order = {}
+                for row in range(src_stop - src_start):
+                    by_order.setdefault(orders[src_start + row], []).append(row)
+                groups = [[order, rows if len(rows) < src_stop - src_start else slice(None)]
+                          for order, rows in by_order.items()]
+            for tgt_start in range(0, size, block_size):
+                tgt_stop = min(tgt_start + block_size, size)
+                tgt_codes = codes[tgt_start:tgt_stop]
+
+                # Columns are added one at a time, in the question order of each source, so the float sums equal
+                # those of create_match
+                scores = np.zeros((src_stop - src_start, tgt_stop - tgt_start), dtype=np.float64)
+                for order, rows in groups:
+                    part = scores if type(rows) is slice else np.zeros((len(rows), tgt_stop - tgt_start))
+                    for column in order:
+                        equal = src_codes[rows, column, None] == tgt_codes[None, :, column]
+                        part += np.where(equal, src_weights[rows, column, None], 0.0)
+                    if part is not scores:
+                        scores[rows] = part
+
+                for row in range(src_stop - src_start):
+                    src_index = src_start + row
+                    raw_scores = scores[row]
+                    row_scores = raw_scores / max_scores[src_index]  # The match_score of create_match
+                    if tgt_start <= src_index < tgt_stop:
+                        row_scores[src_index - tgt_start] = -np.inf  # A survey is never its own target
+                    if len(row_scores) > k:  # Only scores tied with or above the block's k:th best can enter
+                        kth = np.partition(row_scores, len(row_scores) - k)[len(row_scores) - k]
+                        candidates = np.flatnonzero(row_scores >= kth)
+                    else:
+                        candidates = np.arange(len(row_scores))
+                    heap = heaps[src_index]
+                    for col, score, raw_score in zip(candidates.tolist(), row_scores[candidates].tolist(),
+                                                     raw_scores[candidates].tolist()):
+                        if score == -np.inf:
+                            continue
+                        item = (score, -(tgt_start + col), raw_score)
+                        if len(heap) < k:
+                            heappush(heap, item)
+                        elif item > heap[0]:
+                            heappushpop(heap, item)
+
+        for survey, match, heap, max_score in zip(survey_list, results, heaps, max_scores):
+            for _, neg_index, raw_score in sorted(heap, reverse=True):
+                match._add_match(survey, survey_list[-neg_index], raw_score, max_score)
+        return results
+
+    def save(self,path):
+        """Saves source and _score_list of match to directory 'path' as numpy .npy files."""
+        _numpy("to save a match")
+        os.makedirs(path, exist_ok=True)
+        _save_names(path, "source", [self._source])
+        _save_names(path, "target", [match.match_target for match in self._score_list])
+        np.save(os.path.join(path, "score.npy"),
+                np.array([match.match_score for match in self._score_list], dtype=np.float64))
+
+    @classmethod
+    def load(cls,path,mmap=True):
+        """Returns match saved to directory 'path'. If parameter 'mmap' = True the files are memory mapped
+        read-only, so loading is immediate and processes loading the same match share its memory."""
+        _numpy("to load a match")
+        mmap_mode = "r" if mmap else None
+        match = cls()
+        match._source = _decode_names(*_load_names(path, "source", None))[0]
+        kinds, text = _load_names(path, "target", mmap_mode)
+        match._score_list = _ScoreView(match._source, kinds, text,
+                                       np.load(os.path.join(path, "score.npy"), mmap_mode=mmap_mode))
+        return match
 
     def display(self):
         """Graphical representation of match."""
         if self._source:
             print(self._source)
             for target_inst in self._score_list:
-                print([target_inst.match_target,target_inst.match_score])
\ No newline at end of file
+                print([target_inst.match_target,target_inst.match_score])
+
+class MatchIndex:
+    """Inverted index from each answer to a question to the surveys giving it, built once from a population of
+    surveys bound to the same SurveySchema. Answers to questions of the most weight are looked up to find candidate
+    targets quickly, which are then matched exactly with create_match. Changes to the surveys after the index was
+    built are not seen by it, build a new one instead."""
+    def __init__(self,survey_list):
+        _numpy("to build a MatchIndex")
+        if type(survey_list) is not list:
+            raise TypeError("Wrong datatype: survey_list has to be a list!")
+        for survey in survey_list:
+            if type(survey) is not SurveyRes:
+                raise TypeError("Wrong datatype: ALL elements of survey_list has to be of custom type SurveyRes!)")
+        schema = survey_list[0]._schema if survey_list else None
+        if schema is None or any(survey._schema is not schema for survey in survey_list):
+            raise NameError("All surveys of a MatchIndex must be bound to the same SurveySchema!")
+
+        self._schema = schema
+        self._surveys = survey_list
+        self._rows = {id(survey): row for row, survey in enumerate(survey_list)}
+        codes = np.full((len(survey_list), schema.len()), -1, dtype=np.int32)
+        for row, survey in enumerate(survey_list):
+            if len(survey._codes):
+                codes[row, :len(survey._codes)] = np.frombuffer(survey._codes, dtype=np.int32)
+        # Per column the rows sorted by answer code, so the rows giving an answer are one slice found by bisection
+        self._order = np.argsort(codes, axis=0, kind="stable").astype(np.int32)
+        self._sorted = np.take_along_axis(codes, self._order, axis=0)
+
+    def len(self):
+        """Returns number of surveys in index."""
+        return len(self._surveys)
+
+    def query(self,source,k=10,probe=8,candidates=None):
+        """Returns a MatchMake of source holding the k best targets of the index sorted by score, source excluded.
+        Targets are scored by their answers to the 'probe' questions of source with the highest match_values, and
+        the 'candidates' best of them (10*k by default) are matched exactly with create_match. Higher probe and
+        candidates find the true k best more often at the cost of speed, probe=None looks up every question."""
+        if type(source) is not SurveyRes:
+            raise TypeError("Wrong datatype: source has to be of custom type SurveyRes!")
+        if source._schema is not self._schema:
+            raise NameError("Source survey must be bound to the SurveySchema of the index!")
+        if type(k) is not int or k < 1 or (probe is not None and (type(probe) is not int or probe < 1)):
+            raise ValueError("k and probe must be positive integers!")
+        if candidates is None:
+            candidates = 10 * k
+        elif type(candidates) is not int or candidates < k:
+            raise ValueError("candidates must be an integer of at least k!")
+
+        schema = self._schema
+        width = self._sorted.shape[1]
+        questions = sorted([(schema._match_values[column], column, code)
+                            for column, code in enumerate(source._codes) if code != -1 and column < width],
+                           key=lambda question: -question[0])
+        scores = np.zeros(len(self._surveys), dtype=np.float64)
+        for match_value, column, code in questions[:probe]:
+            column_codes = self._sorted[:, column]
+            start = np.searchsorted(column_codes, code, side="left")
+            stop = np.searchsorted(column_codes, code, side="right")
+            scores[self._order[start:stop, column]] += match_value
+        own_row = self._rows.get(id(source))
+        if own_row is not None:
+            scores[own_row] = -np.inf  # A survey is never its own target
+
+        limit = len(scores) - (own_row is not None)
+        if candidates < limit:  # The best candidates, tied scores taken in survey_list order
+            threshold = np.partition(scores, len(scores) - candidates)[len(scores) - candidates]
+            above = np.flatnonzero(scores > threshold)
+            tied = np.flatnonzero(scores == threshold)[:candidates - len(above)]
+            rows = np.sort(np.concatenate((above, tied)))
+        else:
+            rows = np.flatnonzero(scores != -np.inf)
+
+        match = MatchMake()
+        match.create_match(source, [self._surveys[row] for row in rows.tolist()], k=k)
+        return match
+
+def read_surveys(path,schema,respondent="respondent",chunk_size=None,format=None):
+    """Generator of SurveyRes bound to schema, one per respondent in a CSV or JSON lines file, read a line at a time.
+    A CSV file has a header with the 'respondent' column and one column per question, empty cells are unanswered.
+    CSV cells are text: a cell equal to the text of an answer already in schema gets that answer, such as 1 for
+    "1", any other is added as a string. Rows with fewer cells than the header raise ValueError.
+    Each JSON line is an object with the 'respondent' key and one key per answered question. Match_values are taken
+    from schema. Questions are checked against schema once per file (once per set of keys for JSON lines).
+    If parameter 'chunk_size' is given, lists of up to that many surveys are generated instead, ready for
+    MatchMake.create_match. Format is "csv" or "jsonl", by default "csv" if path ends with .csv."""
+    if type(schema) is not SurveySchema:
+        raise TypeError("Wrong datatype: schema has to be of custom type SurveySchema!")
+    if chunk_size is not None and (type(chunk_size) != int or chunk_size < 1):
+        raise ValueError("chunk_size must be a positive integer!")
+    if format is None:
+        format = "csv" if str(path).lower().endswith(".csv") else "jsonl"
+    if format == "csv":
+        surveys = _read_csv(path, schema, respondent)
+    elif format == "jsonl":
+        surveys = _read_jsonl(path, schema, respondent)
+    else:
+        raise ValueError("format must be 'csv' or 'jsonl'")
+
+    if chunk_size is None:
+        yield from surveys
+        return
+    chunk = []
+    for survey in surveys:
+        chunk.append(survey)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _read_csv(path, schema, respondent):
+    """Generator of SurveyRes from a CSV file, see read_surveys."""
+    import csv
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        if respondent not in header:
+            raise NameError("No respondent column in file!")
+        resp_pos = header.index(respondent)
+        by_text = {str(question): column for column, question in enumerate(schema._questions)}
+        readers = _column_readers(schema, [question for pos, question in enumerate(header) if pos != resp_pos],
+                                  by_text, True)
+        positions = [pos for pos in range(len(header)) if pos != resp_pos]
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < len(header):
+                name = row[resp_pos] if resp_pos < len(row) else "unknown"
+                raise ValueError("Row " + str(reader.line_num) + " of respondent " + name +
+                                 " has fewer cells than the header!")
+            codes = array("i", [-1]) * schema.len()
+            size = 0
+            for pos, (column, codebook) in zip(positions, readers):
+                answer = row[pos]
+                if answer == "":
+                    continue
+                code = codebook.get(answer)
+                if code is None:
+                    code = codebook[answer] = schema._code(column, answer)
+                codes[column] = code
+                size += 1
+            yield _coded_survey(row[resp_pos], schema, codes, size)
+
+def _read_jsonl(path, schema, respondent):
+    """Generator of SurveyRes from a JSON lines file, see read_surveys."""
+    import json
+    known = {}  # Tuple of keys of a line -> column readers of its questions
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if respondent not in record:
+                raise NameError("No respondent in line of file!")
+            keys = tuple(record)
+            readers = known.get(keys)
+            if readers is None:
+                readers = known[keys] = _column_readers(schema, [key for key in keys if key != respondent],
+                                                        schema._columns, False)
+            codes = array("i", [-1]) * schema.len()
+            size = 0
+            for (column, codebook), key in zip(readers, [key for key in keys if key != respondent]):
+                answer = record[key]
+                code = codebook.get(answer)
+                if code is None:
+                    code = schema._code(column, answer)
+                codes[column] = code
+                size += 1
+            yield _coded_survey(record[respondent], schema, codes, size)
+
+def _column_readers(schema, questions, columns, by_text):
+    """Returns [column, codebook] of each question, raising NameError if schema doesn't have it.
+    If parameter 'by_text' = True codebooks are copies keyed by answer text, the first answer kept if several share
+    a text, which the caller adds new answers to."""
+    readers = []
+    for question in questions:
+        column = columns.get(question)
+        if column is None:
+            raise NameError("No such question exists in schema!")
+        codebook = schema._codebooks[column]
+        if by_text:
+            text_codebook = {}
+            for answer, code in codebook.items():
+                text_codebook.setdefault(str(answer), code)
+            codebook = text_codebook
+        readers.append([column, codebook])
+    return readers
+
+def _coded_survey(respondent, schema, codes, size):
+    """Returns SurveyRes bound to schema with answer codes already set."""
+    survey = SurveyRes(respondent, schema)
+    survey._codes = codes
+    survey._size = size
+    return survey
+
+class _ScoreView:
+    """Read-only sequence of _MatchInstance over the arrays of a loaded match, creating each instance on access."""
+    def __init__(self, source, kinds, text, scores):
+        self._source = source
+        self._kinds = kinds
+        self._text = text
+        self._scores = scores
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self._scores)
+        if not 0 <= i < len(self._scores):
+            raise IndexError("match index out of range")
+        match = _MatchInstance(self._source, _decode_name(int(self._kinds[i]), str(self._text[i])))
+        match.match_score = float(self._scores[i])
+        match.raw_score = match.max_score = None  # Only the percentage is saved
+        return match
+
+    def __iter__(self):
+        for i in range(len(self._scores)):
+            yield self[i]
+
+_BOUND_EVERY = 8  # Questions compared by create_match with k or min_score between checks of its pruning bound
+
+_NAME_KINDS = {int: 0, float: 1, str: 2}  # Datatype of a saved name -> kind code
+
+def _save_names(path, prefix, names):
+    """Saves int, float or str names as two .npy files: kind code of each name and the names as text."""
+    _numpy("to save names")
+    kinds = []
+    for name in names:
+        kind = _NAME_KINDS.get(type(name))
+        if kind is None:
+            raise TypeError("Wrong datatype for name. Only int, float and string can be saved.")
+        kinds.append(kind)
+    np.save(os.path.join(path, prefix + "_kind.npy"), np.array(kinds, dtype=np.int8))
+    np.save(os.path.join(path, prefix + "_text.npy"), np.array([str(name) for name in names], dtype=np.str_))
+
+def _load_names(path, prefix, mmap_mode):
+    """Returns the kind codes and text arrays saved by _save_names."""
+    _numpy("to load names")
+    return (np.load(os.path.join(path, prefix + "_kind.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, prefix + "_text.npy"), mmap_mode=mmap_mode))
+
+def _decode_name(kind, text):
+    """Returns name of kind code from its text."""
+    if kind == 0:
+        return int(text)
+    if kind == 1:
+        return float(text)
+    return text
+
+def _decode_names(kinds, text):
+    """Returns list of names from the arrays saved by _save_names."""
+    return [_decode_name(kind, name) for kind, name in zip(kinds.tolist(), text.tolist())]
+
+def _pack(survey):
+    """Compact form of a survey sent to worker processes: (respondent, questions, answers, match_values)."""
+    answer_list = survey._results() or ()
+    return (survey._respondent,
+            tuple([quest_res.alias for quest_res in answer_list]),
+            tuple([quest_res.answer for quest_res in answer_list]),
+            tuple([quest_res.match_value for quest_res in answer_list]))
+
+def _score_chunk(source, targets):
+    """Worker process side of create_match: returns the sum of match_values of the equal answers of each packed
+    target and packed source."""
+    _, src_questions, src_answers, src_values = source
+    scores = []
+    for _, questions, answers, values in targets:
+        target_res = dict(zip(questions, zip(answers, values)))
+        match_score = 0
+        for question, answer, match_value in zip(src_questions, src_answers, src_values):
+            res = target_res.get(question)
+            if res is None:
+                raise NameError("Questions in source and target survey doesn't match!")
+            if res[0] == answer:
+                if match_value != res[1]:
+                    raise NameError("Question match_value doesn't match between source and target survey!")
+                else:
+                    match_score += match_value
+        scores.append(match_score)
+    return scores
+
+def _encode(reference, survey_list):
+    """Encodes the answers of survey_list to the questions of SurveyRes reference as an integer matrix, one row per
+    survey, where equal answers to a question get equal codes.
+    Returns the question results of reference, their codes, the code matrix and the matching matrix of match_values.
+    Surveys bound to the same SurveySchema as reference are encoded straight from their stored answer codes."""
+    _numpy("for vectorized matching")
+
+    questions = reference._results() or []
+    schema = reference._schema
+    if schema is not None and all(survey._schema is schema for survey in survey_list):
+        columns = [column for column, code in enumerate(reference._codes) if code != -1]
+        coded = np.full((len(survey_list), schema.len()), -1, dtype=np.int32)
+        for row, survey in enumerate(survey_list):
+            if len(survey._codes):
+                coded[row, :len(survey._codes)] = np.frombuffer(survey._codes, dtype=np.int32)
+        codes = coded[:, columns]
+        if (codes == -1).any():
+            raise NameError("Questions in source and target survey doesn't match!")
+        match_values = np.array([schema._match_values[column] for column in columns], dtype=np.float64)
+        weights = np.broadcast_to(match_values, codes.shape)
+        ref_codes = np.array([reference._codes[column] for column in columns], dtype=np.int32)
+        return questions, ref_codes, codes, weights
+
+    aliases = [quest_res.alias for quest_res in questions]
+    codebooks = [{quest_res.answer: 0} for quest_res in questions]  # The answers of reference get code 0
+    code_rows = []
+    weight_rows = []
+    for survey in survey_list:
+        answers = {quest_res.alias: quest_res for quest_res in survey._results() or ()}
+        code_row = []
+        weight_row = []
+        for alias, codebook in zip(aliases, codebooks):
+            target_res = answers.get(alias)
+            if target_res is None:
+                raise NameError("Questions in source and target survey doesn't match!")
+            code = codebook.get(target_res.answer)
+            if code is None:
+                code = codebook[target_res.answer] = len(codebook)
+            code_row.append(code)
+            weight_row.append(target_res.match_value)
+        code_rows.append(code_row)
+        weight_rows.append(weight_row)
+    codes = np.array(code_rows, dtype=np.int64).reshape(len(survey_list), len(questions))
+    weights = np.array(weight_rows, dtype=np.float64).reshape(len(survey_list), len(questions))
+    return questions, np.zeros(len(questions), dtype=np.int64), codes, weights
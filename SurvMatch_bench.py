@@ -0,0 +1,239 @@
+# Koray Amico Kulbay, Survey Matchmaking API, benchmarks
+
+from os import cpu_count
+from random import Random
+from time import perf_counter
+from tracemalloc import start as trace_start, stop as trace_stop, get_traced_memory
+from SurvMatch import SurveyRes, MatchMake, SurveySchema, MatchIndex, read_surveys
+
+def make_surveys(respondents, questions, answers=5, seed=0, schema=None, match_values="uniform"):
+    """Returns a list of random SurveyRes answering the same questions with the same match_values, each answer
+    one of 'answers' equally likely values. Match_values are "uniform" integers 5 to 15, all "equal" to 1 or
+    "skewed", a few questions weighing far more than the rest. If a SurveySchema is given every survey is bound
+    to it. The same arguments always give the same surveys."""
+    rng = Random(seed)
+    if match_values == "uniform":
+        match_values = [rng.randint(5, 15) for _ in range(questions)]
+    elif match_values == "equal":
+        match_values = [1] * questions
+    elif match_values == "skewed":
+        match_values = [round(rng.paretovariate(1.2), 3) for _ in range(questions)]
+    else:
+        raise ValueError("match_values must be 'uniform', 'equal' or 'skewed'")
+    surveys = []
+    for i in range(respondents):
+        surv = SurveyRes(i, schema)
+        for j in range(questions):
+            surv.add("quest" + str(j), rng.randint(1, answers), match_values[j])
+        surveys.append(surv)
+    return surveys
+
+def bench_unchecked(respondents=20_000, questions=50):
+    """Times adding every answer of random surveys with add versus unchecked_add, stored as objects and as answer
+    codes of a SurveySchema."""
+    rng = Random(0)
+    rows = [[rng.randint(1, 5) for _ in range(questions)] for _ in range(respondents)]
+    names = ["quest" + str(j) for j in range(questions)]
+    results = []
+    for layout in ("objects", "schema"):
+        for method in ("add", "unchecked_add"):
+            schema = SurveySchema() if layout == "schema" else None
+            start = perf_counter()
+            for i, row in enumerate(rows):
+                add = getattr(SurveyRes(i, schema), method)
+                for question, answer in zip(names, row):
+                    add(question, answer, 1)
+            elapsed = perf_counter() - start
+            results.append([layout, method, elapsed])
+            print(method, respondents, "x", questions, "answers,", layout, "layout:", round(elapsed, 3), "s")
+    return results
+
+def bench_create_match(respondents=(1_000, 10_000, 100_000), questions=50):
+    """Times create_match of one source against every other respondent, loop versus vectorized, with surveys
+    stored as objects and as answer codes of a SurveySchema."""
+    results = []
+    for size in respondents:
+        for layout in ("objects", "schema"):
+            surveys = make_surveys(size + 1, questions, schema=SurveySchema() if layout == "schema" else None)
+            for vectorized in (False, True):
+                start = perf_counter()
+                MatchMake().create_match(surveys[0], surveys[1:], vectorized=vectorized)
+                elapsed = perf_counter() - start
+                results.append([size, layout, vectorized, elapsed])
+                print("create_match", size, "targets,", layout, "layout, vectorized =", vectorized, ":",
+                      round(elapsed, 3), "s")
+    return results
+
+def bench_top_k(respondents=100_000, questions=50, k=50):
+    """Times create_match of one source against every other respondent keeping every match and sorting them,
+    versus keeping only the k best, with surveys stored as answer codes of a SurveySchema."""
+    surveys = make_surveys(respondents + 1, questions, schema=SurveySchema())
+    results = []
+    for top in (None, k):
+        start = perf_counter()
+        match = MatchMake()
+        match.create_match(surveys[0], surveys[1:], k=top)
+        best = sorted(match._score_list, key=lambda inst: -inst.match_score)[:k]
+        elapsed = perf_counter() - start
+        del match, best
+        trace_start()  # Traced separately, tracing slows down every allocation
+        match = MatchMake()
+        match.create_match(surveys[0], surveys[1:], k=top)
+        best = sorted(match._score_list, key=lambda inst: -inst.match_score)[:k]
+        peak = get_traced_memory()[1]
+        trace_stop()
+        del match, best
+        results.append([top, elapsed, peak])
+        print("create_match", respondents, "targets, k =", top, ":", round(elapsed, 3), "s, peak",
+              round(peak / 2**20, 1), "MiB")
+    return results
+
+def bench_index(respondents=200_000, questions=50, k=50, queries=20, probes=(4, 8, 16, None)):
+    """Times queries of a MatchIndex probing more and more questions, against an exact create_match with k, and
+    reports the share of the true k best targets found (recall)."""
+    surveys = make_surveys(respondents, questions, schema=SurveySchema())
+    start = perf_counter()
+    index = MatchIndex(surveys)
+    print("MatchIndex of", respondents, "surveys built in", round(perf_counter() - start, 3), "s")
+    sources = surveys[:queries]
+    exact = []
+    start = perf_counter()
+    for source in sources:
+        match = MatchMake()
+        match.create_match(source, [survey for survey in surveys if survey is not source], k=k)
+        exact.append({inst.match_target for inst in match._score_list})
+    scan = (perf_counter() - start) / queries
+    print("exact create_match with k =", k, ":", round(scan * 1e3, 2), "ms/query")
+    results = [[None, scan, 1.0]]
+    for probe in probes:
+        found = 0
+        start = perf_counter()
+        for source, best in zip(sources, exact):
+            near = index.query(source, k, probe)
+            found += len(best & {inst.match_target for inst in near._score_list})
+        elapsed = (perf_counter() - start) / queries
+        results.append([probe, elapsed, found / (k * queries)])
+        print("MatchIndex query, probe =", probe, ":", round(elapsed * 1e3, 2), "ms/query, recall",
+              round(found / (k * queries), 3))
+    return results
+
+def bench_update(respondents=100_000, questions=50):
+    """Times matching again after one answer of the source or of one target changed, against update."""
+    surveys = make_surveys(respondents + 1, questions, schema=SurveySchema())
+    match = MatchMake()
+    match.create_match(surveys[0], surveys[1:])
+    results = []
+    for changed in (surveys[0], surveys[1]):
+        role = "source" if changed is surveys[0] else "target"
+        answer = changed.get("quest0")[1] % 5 + 1
+        changed.remove("quest0")
+        changed.add("quest0", answer, surveys[2].get("quest0")[2])
+        start = perf_counter()
+        MatchMake().create_match(surveys[0], surveys[1:])
+        again = perf_counter() - start
+        start = perf_counter()
+        match.update(changed, "quest0", answer % 5 + 1)
+        updated = perf_counter() - start
+        results.append([role, again, updated])
+        print("changed answer of", role, "of", respondents, "targets, create_match again:", round(again, 3),
+              "s, update:", round(updated, 6), "s")
+    return results
+
+def bench_match_all(respondents=(1_000, 5_000), questions=50, k=10):
+    """Times all-pairs top-k matching against calling create_match once per source."""
+    results = []
+    for size in respondents:
+        surveys = make_surveys(size, questions)
+        start = perf_counter()
+        MatchMake.match_all(surveys, k=k)
+        elapsed = perf_counter() - start
+        results.append([size, elapsed])
+        print("match_all", size, "surveys, k =", k, ":", round(elapsed, 3), "s")
+    return results
+
+def bench_parallel(respondents=200_000, questions=50, max_workers=None):
+    """Times create_match with 1, 2, 4, ... worker processes, up to the number of cores."""
+    surveys = make_surveys(respondents + 1, questions)
+    if max_workers is None:
+        max_workers = cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+    results = []
+    for workers in counts:
+        start = perf_counter()
+        MatchMake().create_match(surveys[0], surveys[1:], workers=workers)
+        elapsed = perf_counter() - start
+        results.append([workers, elapsed])
+        print("create_match", respondents, "targets,", workers, "workers:", round(elapsed, 3), "s,",
+              "speedup", round(results[0][1] / elapsed, 2))
+    return results
+
+def bench_memory(respondents=10_000, questions=200):
+    """Compares the memory held by surveys stored as lists of _QuestRes and as answer codes of a SurveySchema."""
+    results = []
+    for layout in ("objects", "schema"):
+        trace_start()
+        surveys = make_surveys(respondents, questions, schema=SurveySchema() if layout == "schema" else None)
+        current = get_traced_memory()[0]
+        trace_stop()
+        results.append([layout, current])
+        print("memory", respondents, "respondents x", questions, "questions,", layout, "layout:",
+              round(current / 2**20, 1), "MiB,", round(current / (respondents * questions), 1), "bytes/answer")
+        del surveys
+    return results
+
+def bench_read(respondents=100_000, questions=50, answers=5, seed=0):
+    """Times loading a CSV file of survey results with read_surveys against reading it with the csv module and
+    adding every answer to a SurveyRes bound to the same schema."""
+    import csv
+    import os
+    from tempfile import TemporaryDirectory
+    rng = Random(seed)
+    header = ["respondent"] + ["quest" + str(j) for j in range(questions)]
+    results = []
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "surveys.csv")
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for i in range(respondents):
+                writer.writerow([i] + [rng.randint(1, answers) for _ in range(questions)])
+        for method in ("add", "read_surveys"):
+            schema = SurveySchema()
+            for question in header[1:]:
+                schema.add(question, 1)
+            start = perf_counter()
+            if method == "add":
+                with open(path, newline="") as file:
+                    reader = csv.reader(file)
+                    next(reader)
+                    for row in reader:
+                        surv = SurveyRes(row[0], schema)
+                        for question, answer in zip(header[1:], row[1:]):
+                            surv.add(question, answer, 1)
+            else:
+                for chunk in read_surveys(path, schema, chunk_size=10_000):
+                    pass
+            elapsed = perf_counter() - start
+            results.append([method, elapsed])
+            print("load", respondents, "respondents x", questions, "questions with", method, ":",
+                  round(elapsed, 3), "s")
+    return results
+
+def main():
+    bench_read()
+    bench_memory()
+    bench_unchecked()
+    bench_create_match()
+    bench_top_k()
+    bench_index()
+    bench_update()
+    bench_parallel()
+    bench_match_all()
+
+
+if __name__ == '__main__': main()
@@ -1,6 +1,6 @@
 # Koray Amico Kulbay, Survey Matchmaking API, unit test
 
-from SurvMatch import SurveyRes, MatchMake
+from SurvMatch import SurveyRes, MatchMake, SurveySchema, MatchIndex, read_surveys
 from random import randint
 
 def main():
@@ -65,6 +65,322 @@ def main():
    
     tmatch = MatchMake()
 
+    # Vectorized scoring gives the same scores as the loop
+    vmatch = MatchMake()
+    vmatch.create_match(psurv,[tsurv1,tsurv2,tsurv3,tsurv4,tsurv5,tsurv6],vectorized=True)
+    assert [[m.match_target,m.match_score] for m in vmatch._score_list] == \
+           [[m.match_target,m.match_score] for m in match._score_list]
 
+    # All-pairs matching keeps the k best targets of every source, same scores as create_match
+    pool = [psurv,tsurv1,tsurv2,tsurv3,tsurv4,tsurv5,tsurv6]
+    all_matches = MatchMake.match_all(pool,k=3,block_size=2)
+    assert len(all_matches) == len(pool)
+    for source, top in zip(pool, all_matches):
+        full = MatchMake()
+        full.create_match(source,[target for target in pool if target is not source])
+        expected = sorted([[m.match_score,m.match_target] for m in full._score_list],
+                          key=lambda pair: -pair[0])[:3]
+        assert top._source == source._respondent
+        assert [m.match_score for m in top._score_list] == [pair[0] for pair in expected]
+        assert source._respondent not in [m.match_target for m in top._score_list]
 
-if __name__ == '__main__': main()
\ No newline at end of file
+    # Float sums follow each source's own question order, also when surveys added their questions in other orders
+    from random import Random
+    order_rng = Random(11)
+    float_values = [0.1,0.2,0.7,0.3,1e-3,2.9]
+    mixed = []
+    for i in range(40):
+        surv = SurveyRes(i)
+        for j in order_rng.sample(range(6),6):
+            surv.add("q"+str(j),order_rng.randint(1,2),float_values[j])
+        mixed.append(surv)
+    for source, top in zip(mixed, MatchMake.match_all(mixed,k=5,block_size=16)):
+        full = MatchMake()
+        full.create_match(source,[target for target in mixed if target is not source])
+        assert [[m.match_score,m.match_target] for m in top._score_list] == \
+               sorted([[m.match_score,m.match_target] for m in full._score_list],key=lambda pair: -pair[0])[:5]
+
+    # Targets are ranked by match_score as create_match, also for negative sums of match_values and for different raw
+    # scores giving equal match_scores, where the first target is kept
+    for values, answer_rows in (([-1,-1,1],[[1,1,1],[1,1,1],[2,2,1]]),
+                                ([0.1,0.2,0.7,0.3,2.9,0.6,1.3],[[1]*7,[2,2,2,2,2,1,1],[1,1,2,1,2,2,1]])):
+        ranked_pool = []
+        for i, answer_row in enumerate(answer_rows):
+            surv = SurveyRes("R"+str(i))
+            for j, (answer, value) in enumerate(zip(answer_row, values)):
+                surv.add("q"+str(j),answer,value)
+            ranked_pool.append(surv)
+        first = MatchMake.match_all(ranked_pool,k=1)[0]
+        full = MatchMake()
+        full.create_match(ranked_pool[0],ranked_pool[1:])
+        best = sorted(full._score_list,key=lambda m: -m.match_score)[0]
+        assert [[m.match_target,m.match_score] for m in first._score_list] == [[best.match_target,best.match_score]]
+        assert best.match_target == "R1"
+
+    # Parallel scoring keeps target order and scores
+    pmatch = MatchMake()
+    pmatch.create_match(psurv,[tsurv1,tsurv2,tsurv3,tsurv4,tsurv5,tsurv6],workers=2,chunk_size=4)
+    assert [[m.match_target,m.match_score] for m in pmatch._score_list] == \
+           [[m.match_target,m.match_score] for m in match._score_list]
+
+    # Surveys bound to a schema store answer codes but behave the same
+    schema = SurveySchema()
+    coded = []
+    for surv in pool:
+        csurv = SurveyRes(surv._respondent,schema)
+        for i in range(len(questions)):
+            csurv.add(*surv.get(questions[i]))
+        coded.append(csurv)
+    assert schema.len() == len(questions)
+    assert coded[0].get("quest2") == psurv.get("quest2")
+    assert coded[0].len() == len(questions)
+    coded[0].remove("quest2")
+    assert coded[0].len() == len(questions)-1
+    try:
+        coded[0].get("quest2")
+    except NameError:
+        pass
+    try:
+        coded[0].add("quest2",1,weights[1]+1)
+        assert False
+    except NameError:
+        pass
+    coded[0].add(*psurv.get("quest2"))
+    for vectorized in (False,True):
+        cmatch = MatchMake()
+        cmatch.create_match(coded[0],coded[1:],vectorized=vectorized)
+        assert [[m.match_target,m.match_score] for m in cmatch._score_list] == \
+               [[m.match_target,m.match_score] for m in match._score_list]
+    assert [[m.match_score for m in top._score_list] for top in MatchMake.match_all(coded,k=3)] == \
+           [[m.match_score for m in top._score_list] for top in all_matches]
+
+    # Top-k matching keeps the same best targets and scores as sorting every match
+    rng = Random(3)
+    top_values = [rng.choice([1,2.5,7,0.1]) for _ in range(20)]
+    for top_schema in (None,SurveySchema()):
+        many = []
+        for i in range(300):
+            surv = SurveyRes(i,top_schema)
+            for j in range(20):
+                surv.add("q"+str(j),rng.randint(1,3),top_values[j])
+            many.append(surv)
+        full = MatchMake()
+        full.create_match(many[0],many[1:])
+        ranked = sorted(([m.match_score,m.match_target] for m in full._score_list),key=lambda m: -m[0])
+        for options in ({"k":10},{"min_score":0.5},{"k":5,"min_score":0.6},{"k":10,"vectorized":True},
+                        {"k":400}):
+            top = MatchMake()
+            top.create_match(many[0],many[1:],**options)
+            expected = [m for m in ranked if m[0] >= options.get("min_score",0)][:options.get("k")]
+            got = [[m.match_score,m.match_target] for m in top._score_list]
+            assert got == expected
+    # An index looking up every question finds the same best targets, fewer probed questions still k of them
+    index = MatchIndex(many)
+    assert index.len() == 300
+    for options in ({"probe":None,"candidates":299},{"probe":None,"candidates":50}):
+        near = index.query(many[0],k=10,**options)
+        assert near._source == 0
+        assert [[m.match_score,m.match_target] for m in near._score_list] == ranked[:10]
+    near = index.query(many[0],k=10,probe=3)
+    assert len(near._score_list) == 10 and 0 not in [m.match_target for m in near._score_list]
+    try:
+        index.query(psurv)
+        assert False
+    except NameError:
+        pass
+    try:
+        MatchMake().create_match(many[0],many[1:],k=0)
+        assert False
+    except ValueError:
+        pass
+    # Negative match_values don't make top-k matching drop targets among the k best
+    for neg_values in ([5,3,-4,-2],[-5,1,-2,1]):
+        for top_schema in (None,SurveySchema()):
+            negs = []
+            for i in range(40):
+                surv = SurveyRes(i,top_schema)
+                for j, value in enumerate(neg_values):
+                    surv.add("q"+str(j),rng.randint(1,2),value)
+                negs.append(surv)
+            full = MatchMake()
+            full.create_match(negs[0],negs[1:])
+            ranked = sorted(([m.match_score,m.match_target] for m in full._score_list),key=lambda m: -m[0])
+            top = MatchMake()
+            top.create_match(negs[0],negs[1:],k=5)
+            assert [[m.match_score,m.match_target] for m in top._score_list] == ranked[:5]
+
+    # Updated answers change the affected scores the same as matching again
+    for up_schema in (None,SurveySchema()):
+        ups = []
+        for i in range(30):
+            surv = SurveyRes(i,up_schema)
+            for j in range(6):
+                surv.add("q"+str(j),rng.randint(1,3),j+1)
+            ups.append(surv)
+        for options in ({},{"k":5},{"vectorized":True}):
+            umatch = MatchMake()
+            umatch.create_match(ups[0],ups[1:],**options)
+            kept = [m.match_target for m in umatch._score_list]
+            umatch.update(ups[0],"q2",ups[kept[0]].get("q2")[1])
+            umatch.update(ups[kept[0]],"q2",ups[kept[0]].get("q2")[1]%3+1)
+            umatch.update(ups[kept[-1]],"q4",ups[0].get("q4")[1])
+            fresh = MatchMake()
+            fresh.create_match(ups[0],[ups[i] for i in kept])
+            assert [[m.match_target,m.match_score,m.raw_score,m.max_score] for m in umatch._score_list] == \
+                   [[m.match_target,m.match_score,m.raw_score,m.max_score] for m in fresh._score_list]
+        answer = ups[0].get("q4")[1]
+        try:
+            umatch.update(ups[0],"q4",answer,10)  # Targets with the same answer keep match_value 5
+            assert False
+        except NameError:
+            pass
+        assert ups[0].get("q4") == ["q4",answer,5]
+        try:
+            umatch.update(SurveyRes("other"),"q2",1)
+            assert False
+        except NameError:
+            pass
+
+    # Updating a target only changes its match against the latest source
+    src_a, src_b, upd_t = SurveyRes("A"), SurveyRes("B"), SurveyRes("T")
+    for surv, answer in ((src_a,1),(src_b,3),(upd_t,2)):
+        surv.add("q0",answer,1)
+    umatch = MatchMake()
+    umatch.create_match(src_a,[upd_t])
+    umatch.create_match(src_b,[upd_t])
+    umatch.update(upd_t,"q0",3)
+    assert [[m.match_source,m.match_score] for m in umatch._score_list] == [["A",0.0],["B",1.0]]
+
+    # A strict schema validates questions, answers and match_values once, when they are added
+    strict = SurveySchema(strict=True)
+    strict.add("likes_cats",5,[True,False])
+    strict.add("city",3)
+    assert strict.get("likes_cats") == ["likes_cats",5,[True,False]]
+    ssurv = SurveyRes("S1.",strict)
+    ssurv.add("likes_cats",True,5)
+    ssurv.add("city","Lund",3)
+    try:
+        ssurv.add("age",30,1)
+        assert False
+    except NameError:
+        pass
+    ssurv2 = SurveyRes("S2.",strict)
+    try:
+        ssurv2.add("likes_cats","maybe",5)
+        assert False
+    except ValueError:
+        pass
+    ssurv2.add("likes_cats",True,5)
+    ssurv2.add("city","Malmo",3)
+    smatch = MatchMake()
+    smatch.create_match(ssurv,[ssurv2])
+    assert smatch._score_list[0].match_score == 5/8
+    ssurv2.remove("city")
+    try:
+        MatchMake().create_match(ssurv,[ssurv2])
+        assert False
+    except NameError:
+        pass
+
+    # Unchecked adds skip datatype checks but still reject duplicates and schema mismatches
+    usurv = SurveyRes("U.",strict)
+    usurv.unchecked_add("likes_cats",True,5)
+    assert usurv.get("likes_cats") == ssurv.get("likes_cats")
+    for args in (("likes_cats",False,5),("city","Lund",4)):
+        try:
+            usurv.unchecked_add(*args)
+            assert False
+        except NameError:
+            pass
+
+    # Surveys streamed from CSV and JSON lines files equal surveys added one answer at a time
+    import os
+    from tempfile import TemporaryDirectory
+    with TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp,"surveys.csv"),"w") as file:
+            file.write("city,respondent,likes_cats\nLund,S3.,True\n,S4.,False\nMalmo,S5.,\n")
+        with open(os.path.join(tmp,"surveys.jsonl"),"w") as file:
+            file.write('{"respondent": "S3.", "likes_cats": true, "city": "Lund"}\n\n'
+                       '{"respondent": "S4.", "likes_cats": false}\n{"respondent": "S5.", "city": "Malmo"}\n')
+        expected = [["S3.",[["likes_cats",True,5],["city","Lund",3]]],["S4.",[["likes_cats",False,5]]],
+                    ["S5.",[["city","Malmo",3]]]]
+        for name in ("surveys.csv","surveys.jsonl"):
+            streamed = list(read_surveys(os.path.join(tmp,name),strict))
+            assert [[surv._respondent,[surv.get(q) for q in ("likes_cats","city") if surv._get(q)]]
+                    for surv in streamed] == expected
+            assert [surv.len() for surv in streamed] == [2,1,1]
+            chunks = list(read_surveys(os.path.join(tmp,name),strict,chunk_size=2))
+            assert [len(chunk) for chunk in chunks] == [2,1]
+            cmatch = MatchMake()
+            cmatch.create_match(ssurv,chunks[0][:1])
+            assert cmatch._score_list[0].match_score == 1
+        with open(os.path.join(tmp,"bad.csv"),"w") as file:
+            file.write("respondent,likes_cats,age\nS6.,True,30\n")
+        try:
+            list(read_surveys(os.path.join(tmp,"bad.csv"),strict))
+            assert False
+        except NameError:
+            pass
+        with open(os.path.join(tmp,"bad.jsonl"),"w") as file:
+            file.write('{"respondent": "S6.", "likes_cats": "maybe"}\n')
+        try:
+            list(read_surveys(os.path.join(tmp,"bad.jsonl"),strict))
+            assert False
+        except ValueError:
+            pass
+        with open(os.path.join(tmp,"short.csv"),"w") as file:
+            file.write("respondent,likes_cats,city\nS6.,True,Lund\nS7.,False\n")
+        try:
+            list(read_surveys(os.path.join(tmp,"short.csv"),strict))
+            assert False
+        except ValueError as error:
+            assert "S7." in str(error)
+
+        # CSV cells of open questions match answers already given in memory by their text
+        open_schema = SurveySchema()
+        mem_surv = SurveyRes("M.",open_schema)
+        mem_surv.add("q",1,1)
+        with open(os.path.join(tmp,"open.csv"),"w") as file:
+            file.write("respondent,q\nC1.,1\nC2.,yes\n")
+        read_1, read_yes = read_surveys(os.path.join(tmp,"open.csv"),open_schema)
+        assert read_1.get("q") == ["q",1,1] and read_yes.get("q") == ["q","yes",1]
+        omatch = MatchMake()
+        omatch.create_match(mem_surv,[read_1,read_yes])
+        assert [m.match_score for m in omatch._score_list] == [1.0,0.0]
+
+    bad_surv = SurveyRes("Bad.")
+    bad_surv.add("quest1",answers[0],weights[0])
+    try:
+        MatchMake().create_match(psurv,[tsurv1,bad_surv],vectorized=True)
+        assert False
+    except NameError:
+        pass
+    try:
+        MatchMake().create_match(psurv,[tsurv1,bad_surv],workers=2,chunk_size=1)
+        assert False
+    except NameError:
+        pass
+    for i in range(1,len(questions)):
+        bad_surv.add(questions[i],answers[i],weights[i])
+    bad_surv.remove("quest1")
+    bad_surv.add("quest1",answers[0],weights[0]+0.5)
+    try:
+        MatchMake().create_match(psurv,[tsurv1,bad_surv],vectorized=True)
+        assert False
+    except NameError:
+        pass
+
+    # Importing SurvMatch loads numpy, concurrent.futures, csv and json only once a method needs them, and the
+    # import takes milliseconds
+    import subprocess, sys
+    from os.path import abspath, dirname
+    code = ("import sys, time; start = time.perf_counter(); import SurvMatch; elapsed = time.perf_counter() - start; "
+            "print(elapsed, [name for name in ('numpy', 'concurrent.futures', 'csv', 'json') if name in sys.modules])")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=dirname(abspath(__file__)))
+    elapsed, loaded = result.stdout.split(" ", 1)
+    assert loaded.strip() == "[]"
+    assert float(elapsed) < 0.5  # Generous for slow machines without cached bytecode, numpy alone took 0.1 s
+
+
+if __name__ == '__main__': main()
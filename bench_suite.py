@@ -0,0 +1,185 @@
+# Koray Amico Kulbay, network and Survey Matchmaking APIs, benchmark suite
+
+# Module bench_suite times the main entry points of both APIs on seeded synthetic data, so runs on the same machine
+# can be compared over time.
+#
+# Every case builds its data from the generators of network_bench and SurvMatch_bench with a fixed seed, then times
+# only the call under test. The best of several runs is kept, each run on freshly built data so no run is helped by
+# the cache of the one before. Results can be written as JSON and compared with an earlier run:
+#
+#   python bench_suite.py --scale small --out before.json
+#   python bench_suite.py --scale small --compare before.json
+
+import argparse
+import gc
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from random import Random
+from time import perf_counter
+from network import Network
+from SurvMatch import MatchMake, SurveySchema
+from SurvMatch_bench import make_surveys
+from network_bench import chain_network, match_network, random_network, star_network
+
+SCALES = {  # Scale -> [network members, match targets, questions]
+    "small": [10_000, 2_000, 20],
+    "medium": [100_000, 20_000, 50],
+    "large": [1_000_000, 100_000, 50],
+}
+
+MAX_DENSE = 2_000  # Dense match_fill links every pair of equal scores, so it is only run up to this many targets
+
+def case_add(members, targets, questions, seed, match_values):
+    """Adds a chain of 'members' members with Network.add."""
+    net = Network()
+
+    def run():
+        net.add(0)
+        for i in range(1, members):
+            net.add(i, [i - 1])
+    return members, run
+
+def case_remove(members, targets, questions, seed, match_values):
+    """Removes a tenth of the members of a random network in random order."""
+    net = random_network(members, seed)
+    names = Random(seed).sample(range(members), members // 10)
+
+    def run():
+        for name in names:
+            net.remove(name)
+    return len(names), run
+
+def case_collect_chain(members, targets, questions, seed, match_values):
+    """Collects the far end of a chain, a search of every member one layer at a time."""
+    net = chain_network(members)
+    return members, lambda: net.collect(0, members - 1)
+
+def case_collect_star(members, targets, questions, seed, match_values):
+    """Collects the other leaves of a star from one leaf, a search of every member in three layers."""
+    net = star_network(members)
+    return members, lambda: net.collect(1, 2)
+
+def case_collect_random(members, targets, questions, seed, match_values):
+    """Collects distance 3 of a random connected network."""
+    net = random_network(members, seed)
+    return members, lambda: net.collect(0, 3)
+
+def case_layers_match(members, targets, questions, seed, match_values):
+    """Searches every layer of a sparse match_fill network from its source, one layer per distinct score."""
+    net = match_network(targets, questions, seed=seed, match_values=match_values)
+
+    def run():
+        for _ in net.layers(0):
+            pass
+    return targets, run
+
+def _create_match(schema, **options):
+    """Returns a case of create_match with the given options, on surveys bound to a schema if 'schema'."""
+    def case(members, targets, questions, seed, match_values):
+        surveys = make_surveys(targets + 1, questions, seed=seed, schema=SurveySchema() if schema else None,
+                               match_values=match_values)
+        match = MatchMake()
+        return targets, lambda: match.create_match(surveys[0], surveys[1:], **options)
+    case.__doc__ = "Matches one source to 'targets' targets" + (", bound to a schema" if schema else "") + \
+                   "".join(", " + key + "=" + str(value) for key, value in options.items()) + "."
+    return case
+
+def _match_fill(sparse):
+    """Returns a case of match_fill of one source matched to 'targets' targets."""
+    def case(members, targets, questions, seed, match_values):
+        if not sparse:
+            targets = min(targets, MAX_DENSE)
+        surveys = make_surveys(targets + 1, questions, seed=seed, match_values=match_values, schema=SurveySchema())
+        match = MatchMake()
+        match.create_match(surveys[0], surveys[1:])
+        net = Network()
+        return targets, lambda: net.match_fill(match, sparse=sparse)
+    case.__doc__ = "Fills a network from one source matched to 'targets' targets, sparse=" + str(sparse) + "."
+    return case
+
+CASES = {  # Name -> case(members,targets,questions,seed,match_values) returning [size,run], run the call timed
+    "network.add/chain": case_add,
+    "network.remove/random": case_remove,
+    "network.collect/chain": case_collect_chain,
+    "network.collect/star": case_collect_star,
+    "network.collect/random": case_collect_random,
+    "network.layers/match": case_layers_match,
+    "create_match/loop": _create_match(False),
+    "create_match/schema": _create_match(True),
+    "create_match/vectorized": _create_match(True, vectorized=True),
+    "create_match/top_k": _create_match(True, k=10),
+    "match_fill/dense": _match_fill(False),
+    "match_fill/sparse": _match_fill(True),
+}
+
+def run_suite(scales=("small",), cases=None, repeat=3, seed=0, match_values="uniform"):
+    """Runs each case at each scale 'repeat' times and returns a list of results as dicts, match_values of the
+    surveys drawn as in SurvMatch_bench.make_surveys. {case,scale,size,seconds,runs}, seconds being the best run."""
+    results = []
+    for scale in scales:
+        members, targets, questions = SCALES[scale]
+        for name in cases or CASES:
+            runs = []
+            for _ in range(repeat):
+                gc.collect()  # Data of the previous run is freed before timing
+                size, run = CASES[name](members, targets, questions, seed, match_values)
+                start = perf_counter()
+                run()
+                runs.append(perf_counter() - start)
+                del run
+            results.append({"case": name, "scale": scale, "size": size, "seconds": min(runs), "runs": runs})
+            print(scale, name, size, ":", round(min(runs), 4), "s")
+    return results
+
+def metadata(seed, repeat, match_values):
+    """Returns a dict describing the machine and run, stored with the results."""
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "machine": platform.machine(), "numpy": numpy_version, "seed": seed,
+            "repeat": repeat, "match_values": match_values,
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+def compare(results, old_results):
+    """Prints and returns [case,scale,old seconds,seconds,ratio] for each result also found in old_results.
+    A ratio above 1 is slower than before."""
+    old = {(result["case"], result["scale"]): result["seconds"] for result in old_results}
+    rows = []
+    for result in results:
+        before = old.get((result["case"], result["scale"]))
+        if before is None:
+            continue
+        ratio = result["seconds"] / before if before else float("inf")
+        rows.append([result["case"], result["scale"], before, result["seconds"], ratio])
+        print(result["scale"], result["case"], ":", round(before, 4), "->", round(result["seconds"], 4), "s,",
+              round(ratio, 2), "x")
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the network and Survey Matchmaking APIs.")
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["small"])
+    parser.add_argument("--case", nargs="+", choices=list(CASES), help="cases to run, all if not given")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--match-values", choices=["uniform", "equal", "skewed"], default="uniform")
+    parser.add_argument("--out", help="file to write the results to as JSON")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.scale, args.case, args.repeat, args.seed, args.match_values)
+    report = {"meta": metadata(args.seed, args.repeat, args.match_values), "results": results}
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file)["results"])
+    return report
+
+
+if __name__ == '__main__': main(sys.argv[1:])
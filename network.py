@@ -18,30 +18,416 @@
 # 3. By using the match_fill method of network class this MatchMake result of source survey compared to one or more
 #   target surveys can be converted to a network, where efficient network methods now can be used.
 
-from queue import Queue
-from SurvMatch import MatchMake  # SurveyRes,
+import os
+from collections import OrderedDict, deque
+from heapq import heappush, heappop
+from math import floor
+from threading import Lock
+
+# SurvMatch and numpy are imported by the methods needing them on first use, so importing network stays fast.
+np = None  # numpy once imported by _numpy, it is optional and only frozen and saved networks need it
+
+def _numpy(purpose):
+    """Returns numpy, importing it on first use. Raises ImportError saying numpy is required 'purpose' if it isn't
+    installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("numpy is required " + purpose + ".") from None
+        np = numpy
+    return np
 
 class _Node:
     """Creates an instance of a node/member belonging to graph/network"""
+    __slots__ = ("alias", "neighbours", "weight")
+
     def __init__(self,name,neigh_list=None,weight=None):
         self.alias = name
         # self.id = None # TODO(): create random id's
         self.neighbours = neigh_list
         #self.match = match_value
         self.weight = weight
-        self.visited = False
-        self.displayed = False
-        self.rel_pos = None  # Position relative to other node, will be used in later methods
+
+class _Components:
+    """Connected components of a network as a union-find over its nodes, each component having a root node.
+    Kept up to date as members and links are added. Removing links may split a component, so it only marks the
+    components outdated and they are rebuilt by one search over every member on the next query."""
+    __slots__ = ("parent", "size", "valid")
+
+    def __init__(self):
+        self.parent = {}  # node -> parent node, roots are their own parent
+        self.size = {}  # root node -> #members of its component
+        self.valid = True
+
+    def find(self, node):
+        """Returns root node of the component of node, pointing the nodes on the way straight to it."""
+        parent = self.parent
+        root = node
+        while parent[root] is not root:
+            root = parent[root]
+        while parent[node] is not root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def added(self, node):
+        """Adds node as a component of its own."""
+        self.parent[node] = node
+        self.size[node] = 1
+
+    def union(self, node_a, node_b):
+        """Joins the components of two linked nodes, the smaller under the root of the larger."""
+        root_a = self.find(node_a)
+        root_b = self.find(node_b)
+        if root_a is root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+
+    def rebuild(self, members):
+        """Finds the components of the nodes in dict members by searching from every node not yet found."""
+        parent = self.parent = {}
+        size = self.size = {}
+        for root in members.values():
+            if root in parent:
+                continue
+            parent[root] = root
+            count = 1
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                for neigh in node.neighbours or ():
+                    if neigh not in parent:
+                        parent[neigh] = root
+                        count += 1
+                        stack.append(neigh)
+            size[root] = count
+        self.valid = True
+
+class _BFSLayers:
+    """Cached breadth first search from one source: distance of every reached node and the nodes of each distance,
+    layers[d] is a dict used as an ordered set of the nodes d steps from source.
+    The search is advanced one layer at a time, only as far as it has been read."""
+    __slots__ = ("version", "source", "dist", "layers", "complete", "lock")
+
+    def __init__(self, version, source):
+        self.version = version  # Network version the result is valid for
+        self.source = source
+        self.dist = {source: 0}  # _Node -> distance from source
+        self.layers = [{source: None}]  # distance -> {_Node: None}
+        self.complete = False  # True when every node connected to source is in a layer
+        self.lock = Lock()  # Held while advancing, several readers may share the result
+
+    def extend(self, distance):
+        """Searches layers until 'distance' is reached or none are left. Returns False if distance is out of bounds."""
+        if distance < len(self.layers):
+            return True
+        with self.lock:
+            while distance >= len(self.layers) and not self.complete:
+                self._advance()
+            return distance < len(self.layers)
+
+    def members(self, distance):
+        """Returns names of the members in layer 'distance'."""
+        return [node.alias for node in self.layers[distance]]
+
+    def _advance(self):
+        """Searches the layer after the last one, the search is complete when it is empty."""
+        dist = self.dist
+        next_dist = len(self.layers)
+        next_layer = {}
+        for curr_node in self.layers[-1]:
+            if curr_node.neighbours:
+                for neigh in curr_node.neighbours:
+                    if neigh not in dist:
+                        dist[neigh] = next_dist
+                        next_layer[neigh] = None
+        if next_layer:
+            self.layers.append(next_layer)
+        else:
+            self.complete = True
+
+    def _place(self, node, distance):
+        """Puts node in layer 'distance', moving it from its old layer if it had one."""
+        old = self.dist.get(node)
+        if old is not None:
+            del self.layers[old][node]
+        self.dist[node] = distance
+        while len(self.layers) <= distance:
+            self.layers.append({})
+        self.layers[distance][node] = None
+
+    def _drop(self, node):
+        """Removes node from its layer."""
+        del self.layers[self.dist.pop(node)][node]
+
+    def _trim(self):
+        """Removes emptied layers at the far end. Layers in between can't be empty after a repair."""
+        while self.layers and not self.layers[-1]:
+            self.layers.pop()
+
+    def _limit(self):
+        """Returns the last searched distance of a partial search, None if it is complete. Repairs only place nodes
+        up to it, nodes further away are found when the search is advanced."""
+        return None if self.complete else len(self.layers) - 1
+
+    def repair_added(self, node):
+        """Updates distances after node was added with its edges. Only distances shrinking through node change."""
+        limit = self._limit()
+        best = None
+        for neigh in node.neighbours or ():
+            distance = self.dist.get(neigh)
+            if distance is not None and (best is None or distance < best):
+                best = distance
+        if best is None or (limit is not None and best >= limit):  # Not connected to source, or beyond the search
+            return
+        self._place(node, best + 1)
+        queue = deque([node])  # Breadth first from node, so the first shorter distance found is the shortest
+        while queue:
+            curr_node = queue.popleft()
+            next_dist = self.dist[curr_node] + 1
+            if limit is not None and next_dist > limit:
+                continue
+            for neigh in curr_node.neighbours or ():
+                distance = self.dist.get(neigh)
+                if distance is None or distance > next_dist:
+                    self._place(neigh, next_dist)
+                    queue.append(neigh)
+        self._trim()
+
+    def repair_removed(self, node, former_neighbours):
+        """Updates distances after node and its edges to former_neighbours were removed. Only nodes that lost every
+        shortest path to source are searched again, from the unaffected nodes bordering them."""
+        limit = self._limit()
+        removed_dist = self.dist.get(node)
+        if removed_dist is None:  # Wasn't connected to source
+            return
+        self._drop(node)
+
+        # Nodes are affected if no neighbour one step closer to source is left, checked in order of distance
+        affected = {}
+        queue = deque([neigh for neigh in former_neighbours if self.dist.get(neigh) == removed_dist + 1])
+        while queue:
+            curr_node = queue.popleft()
+            if curr_node in affected:
+                continue
+            distance = self.dist[curr_node]
+            for neigh in curr_node.neighbours or ():
+                if self.dist.get(neigh) == distance - 1 and neigh not in affected:
+                    break
+            else:
+                affected[curr_node] = None
+                for neigh in curr_node.neighbours or ():
+                    if self.dist.get(neigh) == distance + 1 and neigh not in affected:
+                        queue.append(neigh)
+
+        for curr_node in affected:
+            self._drop(curr_node)
+        heap = []
+        count = 0  # Breaks ties in heap, keeping order of insertion
+        for curr_node in affected:
+            best = None
+            for neigh in curr_node.neighbours or ():
+                distance = self.dist.get(neigh)
+                if distance is not None and (best is None or distance < best):
+                    best = distance
+            if best is not None and (limit is None or best < limit):
+                heappush(heap, (best + 1, count, curr_node))
+                count += 1
+        while heap:
+            distance, _, curr_node = heappop(heap)
+            if curr_node in self.dist:
+                continue
+            self._place(curr_node, distance)
+            if limit is not None and distance >= limit:
+                continue
+            for neigh in curr_node.neighbours or ():
+                if neigh in affected and neigh not in self.dist:
+                    heappush(heap, (distance + 1, count, neigh))
+                    count += 1
+        self._trim()
+
+class _CSR:
+    """Network compiled to compressed sparse rows. Members get integer ids in order of insertion, the neighbours of
+    member i are indices[indptr[i]:indptr[i+1]]. A network loaded from disk keeps names and weights as saved arrays
+    until first used."""
+    __slots__ = ("indptr", "indices", "_names", "_ids", "_weights", "_no_neighbours", "_saved")
+
+    def __init__(self, members=None):
+        self._ids = None
+        self._saved = None  # Arrays of a loaded network that names, weights and no_neighbours are decoded from
+        if members is None:
+            return
+        nodes = list(members.values())
+        node_ids = {}
+        for i, node in enumerate(nodes):
+            node_ids[node] = i
+        self._names = [node.alias for node in nodes]  # id -> name
+        self._weights = [node.weight for node in nodes]  # id -> weight
+        self._no_neighbours = [node.neighbours is None for node in nodes]  # id -> True if neighbours is None
+        degrees = np.fromiter((len(node.neighbours) if node.neighbours else 0 for node in nodes),
+                              dtype=np.int64, count=len(nodes))
+        self.indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=self.indptr[1:])
+        self.indices = np.fromiter((node_ids[neigh] for node in nodes if node.neighbours for neigh in node.neighbours),
+                                   dtype=np.int64, count=int(self.indptr[-1]))
+
+    @classmethod
+    def load(cls, path, mmap_mode):
+        """Returns _CSR of the arrays saved by save in directory 'path'."""
+        from SurvMatch import _load_names
+        csr = cls()
+        load = lambda name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+        csr.indptr = load("indptr")
+        csr.indices = load("indices")
+        csr._saved = {"names": _load_names(path, "name", mmap_mode), "weight_kind": load("weight_kind"),
+                      "weight": load("weight"), "no_neighbours": load("no_neighbours")}
+        csr._names = csr._weights = csr._no_neighbours = None
+        return csr
+
+    def save(self, path):
+        """Saves arrays to directory 'path' as numpy .npy files."""
+        from SurvMatch import _save_names
+        weight_kinds = []
+        for weight in self.weights:
+            if weight is None:
+                weight_kinds.append(0)
+            elif type(weight) == int:
+                weight_kinds.append(1)
+            elif type(weight) == float:
+                weight_kinds.append(2)
+            else:
+                raise TypeError("Wrong datatype for weight. Only None, int and float can be saved.")
+        os.makedirs(path, exist_ok=True)
+        save = lambda name, array: np.save(os.path.join(path, name + ".npy"), array)
+        save("indptr", self.indptr)
+        save("indices", self.indices)
+        _save_names(path, "name", self.names)
+        save("weight_kind", np.array(weight_kinds, dtype=np.int8))
+        save("weight", np.array([0.0 if weight is None else weight for weight in self.weights], dtype=np.float64))
+        save("no_neighbours", np.array(self.no_neighbours, dtype=bool))
+
+    @property
+    def names(self):
+        """List of names, id -> name."""
+        if self._names is None:
+            from SurvMatch import _decode_names
+            self._names = _decode_names(*self._saved["names"])
+        return self._names
+
+    @property
+    def ids(self):
+        """Dict of ids, name -> id."""
+        if self._ids is None:
+            self._ids = {name: i for i, name in enumerate(self.names)}
+        return self._ids
+
+    @property
+    def weights(self):
+        """List of weights, id -> weight."""
+        if self._weights is None:
+            weights = []
+            for kind, weight in zip(self._saved["weight_kind"].tolist(), self._saved["weight"].tolist()):
+                weights.append(None if kind == 0 else int(weight) if kind == 1 else weight)
+            self._weights = weights
+        return self._weights
+
+    @property
+    def no_neighbours(self):
+        """List of flags, id -> True if neighbours of member is None rather than an empty list."""
+        if self._no_neighbours is None:
+            self._no_neighbours = self._saved["no_neighbours"].tolist()
+        return self._no_neighbours
+
+    def get(self, i):
+        """Returns member with id i as a list. [name,neighbours,weight]."""
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        if start == stop:
+            neighbours_names = None if self.no_neighbours[i] else []
+        else:
+            names = self.names
+            neighbours_names = [names[j] for j in self.indices[start:stop].tolist()]
+        return [self.names[i], neighbours_names, self.weights[i]]
+
+    def nodes(self):
+        """Returns dict of name -> _Node rebuilt from the arrays."""
+        nodes = [_Node(name, None if no_neighbours else [], weight)
+                 for name, weight, no_neighbours in zip(self.names, self.weights, self.no_neighbours)]
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        for i, node in enumerate(nodes):
+            if indptr[i] != indptr[i + 1]:
+                node.neighbours = [nodes[j] for j in indices[indptr[i]:indptr[i + 1]]]
+        return {node.alias: node for node in nodes}
+
+class _CSRLayers(_BFSLayers):
+    """Cached breadth first search over a _CSR, with layers as arrays of member ids. Each layer is searched with
+    array operations and keeps the order a search over the nodes would give."""
+    __slots__ = ("csr", "visited")
+
+    def __init__(self, version, csr, source):
+        self.version = version
+        self.source = source
+        self.csr = csr
+        self.visited = np.zeros(len(csr.names), dtype=bool)
+        self.visited[source] = True
+        self.layers = [np.array([source], dtype=np.int64)]
+        self.complete = False
+        self.lock = Lock()
+
+    def members(self, distance):
+        """Returns names of the members in layer 'distance'."""
+        names = self.csr.names
+        return [names[i] for i in self.layers[distance].tolist()]
+
+    def _advance(self):
+        """Searches the layer after the last one, the search is complete when it is empty."""
+        indptr = self.csr.indptr
+        frontier = self.layers[-1]
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        # Positions in indices of every neighbour of the frontier, in order
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        neighbours = self.csr.indices[offsets + np.arange(len(offsets))]
+        neighbours = neighbours[~self.visited[neighbours]]
+        _, first = np.unique(neighbours, return_index=True)  # Each member once, where it was first found
+        next_layer = neighbours[np.sort(first)]
+        if len(next_layer):
+            self.visited[next_layer] = True
+            self.layers.append(next_layer)
+        else:
+            self.complete = True
+
+def _weight_cost(weight_a, weight_b):
+    """Default cost of a step between two members: the difference of their weights, None counted as 1."""
+    return abs((1.0 if weight_a is None else weight_a) - (1.0 if weight_b is None else weight_b))
 
 class Network:
     """A network of members."""
     # Using graph theory based on adjacency list
-    def __init__(self):
-        self._members = []  # This is a list consisting of _Node elements
+    def __init__(self, cache_size=16, incremental=False):
+        """Parameter 'cache_size' is the number of sources whose BFS result collect keeps, least recently used
+        sources are evicted first. 0 disables the cache.
+        If parameter 'incremental' = True, add and remove repair cached results instead of outdating them.
+        Members of a repaired distance layer may then be listed in another order than a new search would give."""
+        if type(cache_size) != int or cache_size < 0:
+            raise TypeError("cache_size must be a non-negative integer")
+        self._members = {}  # Maps name -> _Node, insertion ordered so it doubles as the member list
         self._size = 0  # Keeps track of #nodes in graph
-        self._center = None  # This instance of a specific _Node is used for matchmaking
-        self._BFS_collect = None
-        self._updated = False  # Methods that alter structure of network changes variable to True
+        self._version = 0  # Methods that alter structure of network increase the version, outdating cached results
+        self._BFS_cache = OrderedDict()  # source name -> _BFSLayers, least recently used first
+        self._cache_size = cache_size
+        self._incremental = incremental
+        self._cache_lock = Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._frozen = None  # None, "rebuild" or "raise", see freeze
+        self._csr = None  # _CSR of frozen network, None until compiled
+        self._unbuilt = False  # True while the members of a loaded network only exist as its _CSR
+        self._components = _Components()  # Connected components, see component_of
 
     def add(self, name, neighbours=None, weight=None):
         """Add single member to network and places it in the right position if it has neighbours.
@@ -55,13 +441,23 @@ class Network:
              pass
         else:
             raise TypeError("Wrong datatype for name. Only int, float and string accepted.")
-
+        self.unchecked_add(name, neighbours, weight)
+
+    def unchecked_add(self, name, neighbours=None, weight=None):
+        """Adds member like add, without checking the datatypes of name and neighbours. Only for bulk data already
+        validated, a name of another datatype than int, float or string is stored as is. Neighbours not in network
+        are added with add."""
+        if self._frozen:
+            self._changing()
         if self._get(name):
             raise NameError("Member already exists!")
 
         add_member = _Node(name, [], weight)
-        self._members.append(add_member)
+        self._members[name] = add_member
         self._size += 1
+        components = self._components
+        if components.valid:
+            components.added(add_member)
         # Makes sure to add the new member in the neighbours_list of each neighbour
         if neighbours:
             for neigh in neighbours:
@@ -74,31 +470,107 @@ class Network:
                         # Possibly double of neigh after recursion
                     except AttributeError:  # Handles the case when neighbour exists, but it doesn't have neighbours
                         node_neigh.neighbours = [add_member]
+                    if components.valid:
+                        components.union(add_member, node_neigh)
                 elif node_neigh is None:
                     self.add(neigh, [add_member.alias])
-        self._updated = True
+        self._version += 1
+        if self._incremental:
+            self._repair(_BFSLayers.repair_added, add_member)
+
+    def add_many(self, members=None, edges=None):
+        """Adds many members and edges at once, without recursion. Parameter 'members' is a list or other iterable
+        of names or [name,weight] pairs, 'edges' an iterable of [name,name] pairs or a tuple of two equally long
+        arrays of names. Members only named in edges are added without weight, as add does for missing neighbours.
+        Raises NameError if a member in 'members' already exists, before anything is added. If a name in edges has
+        the wrong datatype, members and edges before it are kept."""
+        if self._frozen:
+            self._changing()
+        new_members = {}
+        for member in members or ():
+            if type(member) == list or type(member) == tuple:
+                name, weight = member
+            else:
+                name, weight = member, None
+            if type(name) == int or type(name) == str or type(name) == float:
+                pass
+            else:
+                raise TypeError("Wrong datatype for name. Only int, float and string accepted.")
+            if name in self._members or name in new_members:
+                raise NameError("Member already exists!")
+            new_members[name] = _Node(name, [], weight)
+
+        if type(edges) == tuple and len(edges) == 2 and hasattr(edges[0], "tolist"):  # A pair of arrays
+            edges = zip(edges[0].tolist(), edges[1].tolist())
+
+        nodes = self._members
+        nodes.update(new_members)
+        get_node = nodes.get
+        try:
+            for name_a, name_b in edges or ():
+                node_a = get_node(name_a)
+                if node_a is None:
+                    node_a = nodes[name_a] = self._new_node(name_a)
+                elif node_a.neighbours is None:
+                    node_a.neighbours = []
+                node_b = get_node(name_b)
+                if node_b is None:
+                    node_b = nodes[name_b] = self._new_node(name_b)
+                elif node_b.neighbours is None:
+                    node_b.neighbours = []
+                node_a.neighbours.append(node_b)
+                node_b.neighbours.append(node_a)
+        finally:
+            self._size = len(nodes)
+            self._version += 1
+            self._components.valid = False  # Rebuilt on the next query, cheaper than a union per edge
+
+    @classmethod
+    def from_edges(cls, edges, members=None, **options):
+        """Returns a new network of the given edges and members, see add_many. Keyword options are passed on to
+        Network."""
+        network = cls(**options)
+        network.add_many(members, edges)
+        return network
+
+    def _new_node(self, name):
+        """Returns a new node without weight, checking the datatype of name."""
+        if type(name) == int or type(name) == str or type(name) == float:
+            return _Node(name, [])
+        raise TypeError("Wrong datatype for name. Only int, float and string accepted.")
 
     def remove(self,name):
         """Remove single member from network.
-        Very slow, try do avoid. N = len(network), N^N worst case time complexity."""
+        D = #neighbours of member, D^2 worst case time complexity."""
         if type(name) == int or type(name) == str or type(name) == float:
             pass
         else:
             raise TypeError("Wrong datatype for name. Only int, float and string accepted.")
+        self.unchecked_remove(name)
 
+    def unchecked_remove(self, name):
+        """Removes member like remove, without checking the datatype of name."""
+        if self._frozen:
+            self._changing()
         rm_node = self._get(name)
         if rm_node:
+            former_neighbours = list(rm_node.neighbours or ())
             if rm_node.neighbours:
                 for neigh in rm_node.neighbours:
                     neigh.neighbours.remove(rm_node)
                     if len(neigh.neighbours) == 0:
                         neigh.neighbours = None
-            self._members.remove(rm_node)
+            del self._members[rm_node.alias]
             self._size -= 1
+            self._components.valid = False  # Removing links may split a component
         elif rm_node is None:
             raise NameError("No such member exists!")
 
-        self._updated = True
+        self._version += 1
+        if self._incremental:
+            with self._cache_lock:
+                self._BFS_cache.pop(name, None)
+            self._repair(_BFSLayers.repair_removed, rm_node, former_neighbours)
 
     def change_member(self,name,name_ch=None,neighbours_ch=None,weight_ch=None):
         """Change given member 'name' of network. Change name, neighbours or weight."""
@@ -110,15 +582,26 @@ class Network:
             pass
         else:
             raise TypeError("Wrong datatype for name. Only int, float and string accepted.")
+        self.unchecked_change_member(name, name_ch, neighbours_ch, weight_ch)
 
+    def unchecked_change_member(self, name, name_ch=None, neighbours_ch=None, weight_ch=None):
+        """Changes member like change_member, without checking the datatypes of name and neighbours_ch.
+        Neighbours not in network are added with add."""
+        if self._frozen:
+            self._changing()
         node_to_ch = self._get(name)
         if node_to_ch:
             if name_ch:
+                if name_ch != node_to_ch.alias and self._get(name_ch):
+                    raise NameError("Member already exists!")
+                del self._members[node_to_ch.alias]
                 node_to_ch.alias = name_ch
+                self._members[name_ch] = node_to_ch
             if weight_ch:
                 node_to_ch.weight = weight_ch
             if neighbours_ch:
                 if node_to_ch.neighbours:
+                    self._components.valid = False  # Removing links may split a component
                     for neigh in node_to_ch.neighbours:
                         # Before doing below we need to remove the node to change from its neighbours
                         neigh.neighbours.remove(node_to_ch)
@@ -138,24 +621,35 @@ class Network:
                         else:
                             node_neigh_ch.neighbours.append(node_to_ch)
                         # Above we re-add the node to change to an old neighbour
+                        if self._components.valid:
+                            self._components.union(node_to_ch, node_neigh_ch)
                     elif node_neigh_ch is None:
                         self.add(neigh_ch,[name_ch])
 
         elif node_to_ch is None:
             raise NameError("No such member exists!")
 
-        self._updated = True
+        self._version += 1
 
     def clear(self):
         """Clears network of all members."""
-        self._members = []
+        if self._frozen:
+            self._changing()
+        self._members = {}
+        self._unbuilt = False
+        self._components = _Components()
         self._size = 0
-        self._updated = True
-        self._BFS_collect = None
-        self._center = None
+        self._version += 1
+        self._BFS_cache.clear()
 
     def get(self,name):
         """Returns specific member as a list. [name,neighbours,weight]."""
+        csr = self._compiled()
+        if csr is not None:
+            i = csr.ids.get(name)
+            if i is None:
+                raise NameError("No such member exists!")
+            return csr.get(i)
         node = self._get(name)
         if node:
             neighbours_names = node.neighbours
@@ -169,148 +663,343 @@ class Network:
 
     def _get(self,name):
         """Private method to return actual node instance of member. If it doesn't exist it returns None."""
-        for node in self._members:
-            if node.alias == name:
-                return node
+        return self._members.get(name)
 
     def len(self):
         """Returns number of members in network."""
         return self._size
 
-    def match_fill(self,MatchMake_inst):
-        """Creates a network based on the results from the MatchMake object given as input."""
+    def match_fill(self,MatchMake_inst,sparse=False,buckets=None):
+        """Creates a network based on the results from the MatchMake object given as input.
+        Targets with equal score share distance from source, the better the score the closer. If parameter 'buckets'
+        is given, scores are instead grouped in that many equally wide score ranges of [0,1], a perfect match in
+        the top one. Scores outside [0,1], possible with negative match_values, get ranges of the same width below
+        and above.
+        By default every target is linked to every target of the group before it, with many equal scores that is
+        a number of links quadratic in #targets. If parameter 'sparse' = True every target is only linked to the
+        first target of the group before it, giving the same distances from source with one link per target."""
+        from SurvMatch import MatchMake
         if type(MatchMake_inst) is not MatchMake:
             raise TypeError("Wrong datatype: MatchMake_inst has to be of custom type MatchMake!")
+        if buckets is not None and (type(buckets) != int or buckets < 1):
+            raise ValueError("buckets must be a positive integer")
 
         res_dict = {}
         for match in MatchMake_inst._score_list:
+            if buckets is None:
+                key = match.match_score
+            else:
+                key = floor(match.match_score * buckets)
+                if key == buckets and match.match_score <= 1:  # A perfect match shares the top bucket
+                    key = buckets - 1
             try:
-                res_dict[match.match_score].append(match.match_target)
-                
+                res_dict[key].append([match.match_target, match.match_score])
             except KeyError:
-                res_dict[match.match_score] = [match.match_target]
-                
+                res_dict[key] = [[match.match_target, match.match_score]]
 
         self.add(MatchMake_inst._source)  # add source in network
         parent = [MatchMake_inst._source]
-        for score in sorted(res_dict.keys(),reverse=True):
-            for target in res_dict[score]:
+        for key in sorted(res_dict.keys(),reverse=True):
+            for target, score in res_dict[key]:
                 self.add(target,parent,score)
-            parent = res_dict[score]
+            if sparse:
+                parent = [res_dict[key][0][0]]  # First target represents the group
+            else:
+                parent = [target for target, _ in res_dict[key]]
 
     def display(self,source,matched_network=False):
         """Graphical representation of network. Weights displayed as added in network. If parameter 'matched_network' = True, display is adapted to a match_fill network. 
         Weights are then given as percentage of a match corresponding to rules of match_fill. 'matched_network' = False by default. """
         
+        self._build_members()
         if len(self._members) == 0:   # matchch
             raise NameError("Network is empty, no such source exists!")
         
-        handled_members = 0
-        
-        for k in range(len(self._members)):
-            try:
-                depth_k = self.collect(source,k)
-                counter = len(depth_k)
-                for member in depth_k:
-                    curr_node = self._get(member)
+        # The component of source first, then every other component from its first added member
+        sources = [source]
+        shown = {self._component(source)}
+        for member in self._members.values():
+            root = self._components.find(member)
+            if root not in shown:
+                shown.add(root)
+                sources.append(member.alias)
+
+        for component_source in sources:
+            if component_source != source:
+                print("!!DISCONNECTED NETWORK!!")
+            self._display_layers(component_source, matched_network)
 
-                    curr_node.displayed = True  # Marks node as displayed
-                    handled_members += 1
+    def _display_layers(self, source, matched_network):
+        """Prints the members of the component of member source, layer by layer."""
+        for k, depth_k in self.layers(source):
+            counter = len(depth_k)
+            for member in depth_k:
+                curr_node = self._get(member)
 
-                    if matched_network is True:
-                        if curr_node.weight is not None:
-                            weight_perc = str(round((curr_node.weight*100),2))+"%"+" match!"
-                        else:
-                            weight_perc = " No weight"
-                    else:
-                        weight_perc = curr_node.weight
-
-                    if counter != 1:
-                        print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
-                        print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
-                        print("|", curr_node.alias, str(weight_perc), "|")
-                        print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
-                        print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
-
-                        print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"^"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
-                        print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"|"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
-                        print("SHARED DISTANCE FROM SOURCE")
-                        print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"|"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
-                        print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"v"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
-
-                        counter -= 1
-                    elif counter == 1:
-                        print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
-                        print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
-                        print("|", curr_node.alias, str(weight_perc), "|")
-                        print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
-                        print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
-
-            except ValueError:
-                pass
-        
-        # Handles disconnected graphs
-        for member in self._members:
-            if member.displayed == False:
-                print("!!DISCONNECTED NETWORK!!")
                 if matched_network is True:
-                    self.display(source=member.alias,matched_network=True)
+                    if curr_node.weight is not None:
+                        weight_perc = str(round((curr_node.weight*100),2))+"%"+" match!"
+                    else:
+                        weight_perc = " No weight"
                 else:
-                    self.display(source=member.alias)
-            if handled_members == len(self._members):
-                member.displayed = False
+                    weight_perc = curr_node.weight
+
+                if counter != 1:
+                    print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
+                    print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
+                    print("|", curr_node.alias, str(weight_perc), "|")
+                    print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
+                    print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
+
+                    print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"^"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
+                    print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"|"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
+                    print("SHARED DISTANCE FROM SOURCE")
+                    print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"|"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
+                    print(" "*(len("SHARED DISTANCE FROM SOURCE")//2),"v"," "*(len("SHARED DISTANCE FROM SOURCE")//2))
+
+                    counter -= 1
+                elif counter == 1:
+                    print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
+                    print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
+                    print("|", curr_node.alias, str(weight_perc), "|")
+                    print("|", " " * (len(curr_node.alias + str(weight_perc))), " |")
+                    print("-" * (len(curr_node.alias + str(weight_perc)) + 5))
 
     def collect(self, source, distance):
-        """Collects and returns a list of all members of network with 'distance' number of steps from member source."""
+        """Collects and returns a list of all members of network with 'distance' number of steps from member source.
+        Nodes aren't modified, so several threads can collect from the same network at once."""
         if type(distance) != int or distance < 0:
             raise TypeError("Distance must be a positive integer")
 
-        source_node = self._get(source)
-        #Cache
-        if self._center == source_node and self._updated is False:
-            collector = self._BFS_collect
-            try:
-                members_dist = []
-                for node in collector[distance]:
-                    members_dist.append(node.alias)
-                return members_dist
-            except KeyError:
-                raise ValueError("Distance is out of bounds!")
-        
-        if source_node is None:
-            raise NameError("No such member exists!")
-
-        #BFS
-        Q = Queue(maxsize=0)
-        source_node.visited = True
-        source_node.rel_pos = 0
-        Q.put(source_node)
-
-        collector = {}
-        while Q.qsize() != 0:
-            curr_node = Q.get()
-            #Operation
-            try:
-                collector[curr_node.rel_pos].append(curr_node)
-            except KeyError:
-                collector[curr_node.rel_pos] = [curr_node]
+        entry = self._search(source)
+        if not entry.extend(distance):
+            raise ValueError("Distance is out of bounds!")
+        return entry.members(distance)
 
-            if curr_node.neighbours is None:
-                pass
-            else: 
-                for neigh in curr_node.neighbours:
-                    if neigh.visited is False:
-                        neigh.visited = True
-                        neigh.rel_pos = curr_node.rel_pos + 1
-                        Q.put(neigh)
+    def layers(self, source, distance=None):
+        """Generator of [distance,members] for each distance from member source, nearest first. Stops after
+        'distance' if given, layers further away are never searched."""
+        if distance is not None and (type(distance) != int or distance < 0):
+            raise TypeError("Distance must be a positive integer")
 
-        #Handles cache
-        self._updated = False
-        self._center = source_node
-        self._BFS_collect = collector
+        entry = self._search(source)
+        curr_dist = 0
+        while (distance is None or curr_dist <= distance) and entry.extend(curr_dist):
+            if entry.version != self._version:
+                raise RuntimeError("Network changed during iteration!")
+            yield [curr_dist, entry.members(curr_dist)]
+            curr_dist += 1
+
+    def component_of(self, name):
+        """Returns the name of the member representing the connected component of member 'name'. Members of the
+        same component share representative until network changes. Near O(1) time complexity, after a remove
+        the components are found again on the first query."""
+        return self._component(name).alias
+
+    def same_component(self, name_a, name_b):
+        """Returns True if members name_a and name_b are connected by a path of neighbours."""
+        return self._component(name_a) is self._component(name_b)
+
+    def components(self):
+        """Returns a list of [representative,size] for each connected component, largest first."""
+        roots = sorted(self._current_components().size.items(), key=lambda root: -root[1])
+        return [[root.alias, size] for root, size in roots]
+
+    def _component(self, name):
+        """Returns root node of the component of member 'name'."""
+        components = self._current_components()
+        node = self._get(name)
+        if node is None:
+            raise NameError("No such member exists!")
+        return components.find(node)
+
+    def _current_components(self):
+        """Returns _Components of network, rebuilt first if outdated."""
+        self._build_members()
+        components = self._components
+        if not components.valid:
+            components.rebuild(self._members)
+        return components
+
+    def within(self, source, radius, cost=None):
+        """Returns a list of [name,distance] of every member within weighted distance 'radius' from member source,
+        nearest first, source excluded. A step between two members costs cost(weight_a,weight_b), by default the
+        difference of their weights with None counted as 1, so in a match_fill network distance is 1 - match score.
+        Dijkstra's search, only members within radius and their neighbours are visited."""
+        if type(radius) != int and type(radius) != float or radius < 0:
+            raise TypeError("Radius must be a positive number")
+        found = []
+        for name, distance in self._settle(source, cost):
+            if distance > radius:
+                break
+            found.append([name, distance])
+        return found[1:]
+
+    def k_nearest(self, source, k, cost=None):
+        """Returns a list of [name,distance] of the k members of least weighted distance from member source,
+        nearest first, source excluded. Distance as in within. The search stops as soon as k members are found."""
+        if type(k) != int or k < 1:
+            raise TypeError("k must be a positive integer")
+        found = []
+        for member in self._settle(source, cost):
+            found.append(member)
+            if len(found) > k:
+                break
+        return found[1:]
+
+    def _settle(self, source, cost):
+        """Generator of [name,distance] of members in order of weighted distance from member source, source first.
+        Frozen networks are searched over their compiled arrays."""
+        if cost is None:
+            cost = _weight_cost
+        csr = self._compiled()
+        if csr is None:
+            start = self._get(source)
+            name_of = lambda node: node.alias
+            weight_of = lambda node: node.weight
+            neighbours_of = lambda node: node.neighbours or ()
+        else:
+            start = csr.ids.get(source)
+            names, weights, indptr, indices = csr.names, csr.weights, csr.indptr, csr.indices
+            name_of = names.__getitem__
+            weight_of = weights.__getitem__
+            neighbours_of = lambda i: indices[indptr[i]:indptr[i + 1]].tolist()
+        if start is None:
+            raise NameError("No such member exists!")
 
-        for node in self._members:  # Remark nodes as unvisited and no relative position for future use
-            node.visited = False
-            node.rel_pos = None
+        best = {start: 0}
+        settled = set()
+        heap = [(0, 0, start)]  # (distance, order found, member), equal distances settled in order found
+        found = 1
+        while heap:
+            distance, _, member = heappop(heap)
+            if member in settled:
+                continue
+            settled.add(member)
+            yield [name_of(member), distance]
+            weight = weight_of(member)
+            for neigh in neighbours_of(member):
+                if neigh in settled:
+                    continue
+                step = cost(weight, weight_of(neigh))
+                if step < 0:
+                    raise ValueError("Cost between members must not be negative!")
+                if neigh not in best or distance + step < best[neigh]:
+                    best[neigh] = distance + step
+                    heappush(heap, (distance + step, found, neigh))
+                    found += 1
+
+    def _search(self, source):
+        """Returns the cached, possibly partial, search from member source or starts a new one.
+        Frozen networks are searched over their compiled arrays."""
+        csr = self._compiled()
+        if csr is None:
+            start = self._get(source)
+        else:
+            start = csr.ids.get(source)
+        if start is None:
+            raise NameError("No such member exists!")
 
-        return self.collect(source,distance)
\ No newline at end of file
+        version = self._version
+        with self._cache_lock:
+            entry = self._BFS_cache.get(source)
+            if entry is not None and entry.version == version:
+                self._BFS_cache.move_to_end(source)
+                self._cache_hits += 1
+                return entry
+            self._cache_misses += 1
+            if csr is None:
+                entry = _BFSLayers(version, start)
+            else:
+                entry = _CSRLayers(version, csr, start)
+            if self._cache_size:
+                self._BFS_cache[source] = entry
+                self._BFS_cache.move_to_end(source)
+                if len(self._BFS_cache) > self._cache_size:
+                    self._BFS_cache.popitem(last=False)
+            return entry
+
+    def _repair(self, repair, *args):
+        """Applies repair method of _BFSLayers to every cached result that was valid before the latest change,
+        making them valid for the current version. Partial results are repaired up to the distance searched."""
+        with self._cache_lock:
+            for entry in self._BFS_cache.values():
+                if entry.version == self._version - 1 and type(entry) is _BFSLayers:
+                    with entry.lock:
+                        repair(entry, *args)
+                        entry.version = self._version
+
+    def freeze(self, on_change="rebuild"):
+        """Compiles network to integer arrays (compressed sparse rows) that get and collect answer from.
+        Meant for networks that are read far more than changed. Parameter 'on_change' sets what changing a frozen
+        network does: "rebuild" compiles it again on the next read, "raise" raises RuntimeError. Needs numpy."""
+        if on_change != "rebuild" and on_change != "raise":
+            raise ValueError("on_change must be 'rebuild' or 'raise'")
+        _numpy("to freeze a network")
+        self._build_members()
+        self._frozen = on_change
+        self._csr = None
+        self._version += 1  # Cached searches over nodes are replaced by searches over the arrays
+        self._compiled()
+
+    def unfreeze(self):
+        """Returns a frozen network to its normal, changeable state."""
+        self._build_members()
+        self._frozen = None
+        self._csr = None
+        self._version += 1
+
+    def _compiled(self):
+        """Returns _CSR of a frozen network, compiling it if needed, or None if network isn't frozen."""
+        if self._frozen is None:
+            return None
+        csr = self._csr
+        if csr is None:
+            csr = self._csr = _CSR(self._members)
+        return csr
+
+    def _changing(self):
+        """Called before a frozen network changes. Raises RuntimeError or drops the compiled arrays, as chosen in
+        freeze."""
+        if self._frozen == "raise":
+            raise RuntimeError("Network is frozen!")
+        self._build_members()
+        self._csr = None
+
+    def _build_members(self):
+        """Creates the nodes of a loaded network from its arrays."""
+        if self._unbuilt:
+            self._members = self._csr.nodes()
+            self._unbuilt = False
+            self._components.valid = False
+
+    def save(self, path):
+        """Saves network to directory 'path' as numpy .npy files: names, weights and neighbours as compressed sparse
+        rows. Names and weights need to be int, float or str, weights may also be None."""
+        _numpy("to save a network")
+        csr = self._compiled()
+        if csr is None:
+            csr = _CSR(self._members)
+        csr.save(path)
+
+    @classmethod
+    def load(cls, path, mmap=True, on_change="raise", **options):
+        """Returns network saved to directory 'path', frozen as by freeze(on_change). If parameter 'mmap' = True the
+        files are memory mapped read-only, so loading is immediate and processes loading the same network share
+        its memory. Names are read on first use, nodes are only created if the network is changed or unfrozen.
+        Keyword options are passed on to Network."""
+        if on_change != "rebuild" and on_change != "raise":
+            raise ValueError("on_change must be 'rebuild' or 'raise'")
+        _numpy("to load a network")
+        network = cls(**options)
+        network._csr = _CSR.load(path, "r" if mmap else None)
+        network._frozen = on_change
+        network._size = len(network._csr.indptr) - 1
+        network._unbuilt = True
+        return network
+
+    def cache_info(self):
+        """Returns statistics of the collect cache as a dict. {hits,misses,size,capacity}."""
+        with self._cache_lock:
+            return {"hits": self._cache_hits, "misses": self._cache_misses,
+                    "size": len(self._BFS_cache), "capacity": self._cache_size}
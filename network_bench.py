@@ -0,0 +1,296 @@
+# Koray Amico Kulbay, network API, benchmarks
+
+from random import Random
+from time import perf_counter
+from network import Network
+from SurvMatch import MatchMake, SurveySchema
+from SurvMatch_bench import make_surveys
+
+def bench_build(sizes=(10_000, 100_000, 1_000_000)):
+    """Times building networks of increasing size with Network.add, each member linked to the previous one.
+    With hash-indexed lookups the time per member stays flat instead of growing with the size of the network."""
+    results = []
+    for size in sizes:
+        net = Network()
+        start = perf_counter()
+        net.add(0)
+        for i in range(1, size):
+            net.add(i, [i - 1])
+        elapsed = perf_counter() - start
+        results.append([size, elapsed, elapsed / size * 1e6])
+        print("build", size, "members:", round(elapsed, 3), "s,", round(elapsed / size * 1e6, 3), "us/member")
+    return results
+
+def random_network(size, seed=0, **options):
+    """Returns a connected network where member i is linked to member i-1 and to a random earlier member.
+    Keyword options are passed on to Network."""
+    rng = Random(seed)
+    net = Network(**options)
+    net.add(0)
+    net.add(1, [0])
+    for i in range(2, size):
+        net.add(i, [i - 1, rng.randrange(i - 1)])
+    return net
+
+def chain_network(size, **options):
+    """Returns a network where member i is linked to member i-1, the deepest shape for a search."""
+    return Network.from_edges(zip(range(size - 1), range(1, size)), [0], **options)
+
+def star_network(size, **options):
+    """Returns a network where member 0 is linked to every other member, the widest shape for a search."""
+    return Network.from_edges(zip([0] * (size - 1), range(1, size)), [0], **options)
+
+def match_network(targets, questions=50, answers=5, sparse=True, seed=0, match_values="uniform", **options):
+    """Returns a network filled by match_fill from random surveys, one source matched to 'targets' targets, so
+    members are layered by score. See SurvMatch_bench.make_surveys for the surveys."""
+    surveys = make_surveys(targets + 1, questions, answers, seed, SurveySchema(), match_values)
+    match = MatchMake()
+    match.create_match(surveys[0], surveys[1:])
+    net = Network(**options)
+    net.match_fill(match, sparse=sparse)
+    return net
+
+def bench_collect(size=1_000_000, seed=0):
+    """Times a full breadth first search with collect over a random connected network of 'size' members,
+    and a collect of distance 1 which only searches the first layers."""
+    net = random_network(size, seed)
+    start = perf_counter()
+    net.collect(0, 1)
+    near = perf_counter() - start
+    start = perf_counter()
+    for _ in net.layers(0):
+        pass
+    elapsed = perf_counter() - start
+    print("collect BFS over", size, "members:", round(elapsed, 3), "s, distance 1 only:", round(near, 6), "s")
+    return [size, elapsed, near]
+
+def bench_frozen(size=1_000_000, seed=0):
+    """Times a full breadth first search over nodes versus over the compiled arrays of a frozen network."""
+    net = random_network(size, seed)
+    results = []
+    for frozen in (False, True):
+        if frozen:
+            start = perf_counter()
+            net.freeze()
+            print("freeze", size, "members:", round(perf_counter() - start, 3), "s")
+        start = perf_counter()
+        for _ in net.layers(0):
+            pass
+        elapsed = perf_counter() - start
+        results.append([frozen, elapsed])
+        print("full search over", size, "members, frozen =", frozen, ":", round(elapsed, 3), "s")
+    return results
+
+def bench_persist(size=1_000_000, seed=0):
+    """Times saving a network and loading it back memory mapped, until the first collect is answered."""
+    from tempfile import TemporaryDirectory
+    net = random_network(size, seed)
+    with TemporaryDirectory() as tmp:
+        start = perf_counter()
+        net.save(tmp)
+        saved = perf_counter() - start
+        start = perf_counter()
+        loaded = Network.load(tmp)
+        opened = perf_counter() - start
+        loaded.collect(0, 1)
+        first = perf_counter() - start
+        del loaded
+    print("save", size, "members:", round(saved, 3), "s, load:", round(opened, 6), "s, load and first collect:",
+          round(first, 3), "s")
+    return [size, saved, opened, first]
+
+def bench_incremental(size=100_000, adds=100, distance=5, seed=0):
+    """Times a stream of adds, each followed by a search of every layer from the same source or by a collect of
+    'distance', with cached results outdated by every add versus repaired incrementally."""
+    results = []
+    for search in ("every layer", "collect"):
+        for incremental in (False, True):
+            rng = Random(seed)
+            net = random_network(size, seed, incremental=incremental)
+            read = (lambda: list(net.layers(0))[-1]) if search == "every layer" else lambda: net.collect(0, distance)
+            read()
+            start = perf_counter()
+            for i in range(size, size + adds):
+                net.add(i, [rng.randrange(i)])
+                read()
+            elapsed = perf_counter() - start
+            results.append([search, incremental, elapsed])
+            print("stream of", adds, "adds, each followed by", "a search of every layer" if search == "every layer"
+                  else "collect of distance " + str(distance), "on", size, "members, incremental =", incremental, ":",
+                  round(elapsed, 3), "s, cache hits", net.cache_info()["hits"])
+    return results
+
+def bench_bulk(members=1_000_000, edges=10_000_000, seed=0):
+    """Times loading a random edge list given as a pair of numpy arrays with Network.from_edges."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(0, members, edges)
+    targets = rng.integers(0, members, edges)
+    start = perf_counter()
+    net = Network.from_edges((sources, targets))
+    elapsed = perf_counter() - start
+    print("from_edges", edges, "edges,", net.len(), "members:", round(elapsed, 3), "s")
+    return [edges, elapsed]
+
+def bench_unchecked(size=1_000_000):
+    """Times building a network where member i is linked to member i-1 with add versus unchecked_add."""
+    import gc
+    results = []
+    for method in ("add", "unchecked_add"):
+        gc.collect()  # The network of the previous round is freed before timing
+        net = Network()
+        add = getattr(net, method)
+        start = perf_counter()
+        add(0)
+        for i in range(1, size):
+            add(i, [i - 1])
+        elapsed = perf_counter() - start
+        results.append([method, elapsed])
+        print(method, size, "members:", round(elapsed, 3), "s,", round(elapsed / size * 1e6, 3), "us/member")
+        del net, add
+    return results
+
+def bench_components(size=1_000_000, parts=1_000, queries=100_000, seed=0):
+    """Times same_component queries on a network of 'parts' disconnected random networks, kept up to date while
+    the members were added, and rebuilt once after a remove. Also times display of a network of 'parts' isolated
+    members, which searched every member again for each component before."""
+    from contextlib import redirect_stdout
+    from io import StringIO
+    rng = Random(seed)
+    net = Network()
+    for i in range(size):
+        part = i % parts
+        net.add(i, [i - parts, rng.randrange(part, i, parts)] if i >= 2 * parts else [])
+    pairs = [[rng.randrange(size), rng.randrange(size)] for _ in range(queries)]
+    results = []
+    for state in ("maintained", "after remove"):
+        if state == "after remove":
+            net.remove(size - 1)
+            pairs = [[a % (size - 1), b % (size - 1)] for a, b in pairs]
+        start = perf_counter()
+        for a, b in pairs:
+            net.same_component(a, b)
+        elapsed = perf_counter() - start
+        results.append([state, elapsed])
+        print(queries, "same_component queries on", size, "members,", state, ":", round(elapsed, 3), "s")
+    start = perf_counter()
+    with redirect_stdout(StringIO()):
+        Network.from_edges([], [str(i) for i in range(parts)]).display("0")
+    elapsed = perf_counter() - start
+    results.append(["display", elapsed])
+    print("display of", parts, "disconnected members:", round(elapsed, 3), "s")
+    return results
+
+def bench_instrumented(calls=200_000, targets=20_000, questions=50):
+    """Measures the overhead of profiling.instrument: per call of collect answered from the cache, and on a
+    create_match and match_fill of 'targets' targets, whose adds and lookups are counted."""
+    from profiling import Stats, instrument
+    net = random_network(1_000)
+    surveys = make_surveys(targets + 1, questions, schema=SurveySchema())
+    results = []
+    for instrumented in (False, True):
+        stats = Stats()
+        match = MatchMake()
+        fill = Network()
+        if instrumented:
+            instrument(net, stats)
+            instrument(match, stats)
+            instrument(fill, stats)
+        net.collect(0, 2)
+        start = perf_counter()
+        for _ in range(calls):
+            net.collect(0, 2)
+        per_call = (perf_counter() - start) / calls
+        start = perf_counter()
+        match.create_match(surveys[0], surveys[1:])
+        matched = perf_counter() - start
+        start = perf_counter()
+        fill.match_fill(match, sparse=True)
+        filled = perf_counter() - start
+        results.append([instrumented, per_call, matched, filled])
+        print("instrumented =", instrumented, ": collect", round(per_call * 1e6, 3), "us/call, create_match",
+              round(matched, 3), "s, match_fill", round(filled, 3), "s")
+    return results
+
+def bench_match_fill(targets=(1_000, 5_000, 100_000), questions=4):
+    """Times dense versus sparse match_fill of one source matched to many targets with few distinct scores,
+    counting the links created."""
+    results = []
+    for size in targets:
+        surveys = make_surveys(size + 1, questions, schema=SurveySchema())
+        match = MatchMake()
+        match.create_match(surveys[0], surveys[1:])
+        for sparse in (False, True):
+            if not sparse and size > 10_000:  # Dense links grow quadratically
+                continue
+            net = Network()
+            start = perf_counter()
+            net.match_fill(match, sparse=sparse)
+            elapsed = perf_counter() - start
+            links = sum(len(net.get(name)[1] or ()) for name in net._members) // 2
+            results.append([size, sparse, elapsed, links])
+            print("match_fill", size, "targets, sparse =", sparse, ":", round(elapsed, 3), "s,", links, "links")
+    return results
+
+def bench_weighted(targets=100_000, questions=50, radius=0.65, k=50):
+    """Times finding the members of a sparse match_fill network within 'radius' of 1 - match score, and the k best
+    matches, by collecting every layer and filtering on weight, versus within and k_nearest."""
+    surveys = make_surveys(targets + 1, questions, schema=SurveySchema())
+    match = MatchMake()
+    match.create_match(surveys[0], surveys[1:])
+    net = Network()
+    net.match_fill(match, sparse=True)
+    source = surveys[0]._respondent
+
+    start = perf_counter()
+    weighted = []
+    for _, layer in net.layers(source):
+        for name in layer:
+            weight = net.get(name)[2]
+            if weight is not None:
+                weighted.append([name, weight])
+    close = [name for name, weight in weighted if 1 - weight <= radius]
+    best = [name for name, _ in sorted(weighted, key=lambda member: -member[1])[:k]]
+    filtered = perf_counter() - start
+
+    start = perf_counter()
+    near = net.within(source, radius)
+    within = perf_counter() - start
+    start = perf_counter()
+    nearest = net.k_nearest(source, k)
+    k_nearest = perf_counter() - start
+    print("collect and filter", targets, "targets:", round(filtered, 3), "s, within", radius, ":", round(within, 4),
+          "s,", len(near), "of", len(close), "members, k_nearest", k, ":", round(k_nearest, 4), "s")
+    return [targets, filtered, within, k_nearest]
+
+def bench_import(runs=20, modules=("network", "SurvMatch", "network, SurvMatch", "numpy")):
+    """Times importing each of modules in a new interpreter, the median of 'runs' processes, as paid by every short
+    lived worker or CLI job. numpy is given for comparison, importing network or SurvMatch doesn't load it."""
+    import subprocess, sys
+    from os.path import abspath, dirname
+    from statistics import median
+    results = []
+    for module in modules:
+        code = "import time; start = time.perf_counter(); import " + module + "; print(time.perf_counter() - start)"
+        times = [float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                      cwd=dirname(abspath(__file__))).stdout) for _ in range(runs)]
+        results.append([module, median(times)])
+        print("import", module, ":", round(median(times) * 1000, 2), "ms")
+    return results
+
+def main():
+    bench_build()
+    bench_collect()
+    bench_frozen()
+    bench_persist()
+    bench_incremental()
+    bench_bulk()
+    bench_unchecked()
+    bench_components()
+    bench_match_fill()
+    bench_instrumented()
+    bench_weighted()
+    bench_import()
+
+
+if __name__ == '__main__': main()
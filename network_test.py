@@ -55,11 +55,225 @@ def main():
     assert tnet.collect(2, 2) == [3,8]
     assert tnet.collect(2, 3) == [5,6]
     assert tnet.collect(2, 4) == [7]
+    assert list(tnet.layers(2)) == [[0, [2]], [1, [1, 4]], [2, [3, 8]], [3, [5, 6]], [4, [7]]]
+
+    # Layers are searched lazily, only as far as they are read
+    lnet = Network()
+    lnet.add("a", ["b"])
+    lnet.add("c", ["b"])
+    lnet.add("d", ["c"])
+    assert list(lnet.layers("a", 1)) == [[0, ["a"]], [1, ["b"]]]
+    assert len(lnet._BFS_cache["a"].layers) == 2
+    assert lnet.collect("a", 3) == ["d"]
+    from io import StringIO
+    from contextlib import redirect_stdout
+    out = StringIO()
+    with redirect_stdout(out):
+        lnet.display("a")
+    assert [line.strip("| ") for line in out.getvalue().split("\n") if line.strip("| ")[:1].isalpha()] == \
+           ["a None", "b None", "c None", "d None"]
     try:
         tnet.collect(2, 5)
     except ValueError:
         pass
 
+    # Collect results are cached per source, least recently used evicted, outdated by changes
+    cnet = Network(cache_size=2)
+    cnet.add(1, [2, 3])
+    cnet.collect(1, 1)
+    cnet.collect(2, 1)
+    assert cnet.cache_info() == {"hits": 0, "misses": 2, "size": 2, "capacity": 2}
+    cnet.collect(1, 0)
+    cnet.collect(3, 1)  # Evicts 2
+    cnet.collect(1, 1)
+    cnet.collect(2, 1)
+    assert cnet.cache_info() == {"hits": 2, "misses": 4, "size": 2, "capacity": 2}
+    cnet.add(4, [3])
+    assert cnet.collect(1, 2) == [4]
+    assert cnet.cache_info()["misses"] == 5
+
+    # Incrementally repaired results equal a new breadth first search, partial results up to the distance searched
+    from random import Random
+    from network import _BFSLayers
+
+    def full_search(net, source_node):
+        entry = _BFSLayers(net._version, source_node)
+        while not entry.complete:
+            entry._advance()
+        return entry
+
+    rng = Random(7)
+    inet = Network(cache_size=16, incremental=True)
+    inet.add(0)
+    names = [0]
+    for step in range(1, 400):
+        if rng.random() < 0.3 and len(names) > 8:
+            name = names.pop(rng.randrange(1, len(names)))
+            inet.remove(name)
+        else:
+            inet.add(step, rng.sample(names, min(len(names), rng.randint(0, 2))))
+            names.append(step)
+        for source in names[:6]:
+            for _ in inet.layers(source):  # Searches every layer, completing the cached result
+                pass
+            entry = inet._BFS_cache[source]
+            fresh = full_search(inet, inet._get(source))
+            assert entry.version == inet._version
+            assert entry.dist == fresh.dist
+            assert [sorted(node.alias for node in layer) for layer in entry.layers] == \
+                   [sorted(node.alias for node in layer) for layer in fresh.layers]
+        for source in names[6:12]:
+            distance = rng.randint(0, 3)  # Only searches up to distance, leaving the cached result partial
+            fresh = full_search(inet, inet._get(source))
+            try:
+                assert sorted(inet.collect(source, distance)) == sorted(node.alias for node in fresh.layers[distance])
+            except ValueError:
+                assert distance >= len(fresh.layers)
+            entry = inet._BFS_cache[source]
+            assert entry.version == inet._version
+            assert entry.dist == {node: dist for node, dist in fresh.dist.items() if dist < len(entry.layers)}
+    assert inet.cache_info()["hits"] > inet.cache_info()["misses"]
+    pnet = Network(incremental=True)
+    pnet.add(0)
+    for name in range(1, 2000):
+        pnet.add(name, [name - 1, rng.randrange(name)])
+    pnet.collect(0, 2)
+    for name in range(2000, 2050):
+        pnet.add(name, [rng.randrange(name)])
+        assert sorted(pnet.collect(0, 2)) == sorted(node.alias for node in full_search(pnet, pnet._get(0)).layers[2])
+    assert pnet.cache_info()["misses"] == 1
+
+    # Connected components follow adds, links and removals, the same as searching every member
+    knet = Network()
+    knet.add(0)
+    knames = [0]
+    for step in range(1, 300):
+        roll = rng.random()
+        if roll < 0.15 and len(knames) > 5:
+            knet.remove(knames.pop(rng.randrange(len(knames))))
+        elif roll < 0.25:
+            knet.change_member(rng.choice(knames), neighbours_ch=rng.sample(knames, 1))
+        else:
+            knet.add(step, rng.sample(knames, rng.randint(0, 1)))
+            knames.append(step)
+        if step % 25 == 0:
+            expected = {name: frozenset(m for _, layer in knet.layers(name) for m in layer) for name in knames}
+            assert all(knet.same_component(a, b) == (b in expected[a]) for a in knames for b in knames[:20])
+            assert sorted(size for _, size in knet.components()) == sorted(len(c) for c in set(expected.values()))
+            assert all(knet.component_of(knet.component_of(name)) == knet.component_of(name) for name in knames)
+    out = StringIO()
+    with redirect_stdout(out):
+        Network.from_edges([], [str(i) for i in range(5000)]).display("0")  # Far beyond the recursion limit
+    assert out.getvalue().count("!!DISCONNECTED NETWORK!!") == 4999
+
+    # Bulk construction gives the same network as adding one member at a time
+    bnet = Network.from_edges([[1, 2], [1, 3], [4, 2], [5, 3], [6, 3], [8, 4], [7, 6]], [[1, 0.5], 9])
+    assert bnet.len() == 9
+    assert bnet.get(1) == [1, [2, 3], 0.5]
+    assert bnet.get(9) == [9, [], None]
+    assert [bnet.collect(2, k) for k in range(5)] == [[2], [1, 4], [3, 8], [5, 6], [7]]
+    try:
+        bnet.add_many([9])
+    except NameError:
+        pass
+    try:
+        bnet.add_many([], [[10, [11]]])
+    except TypeError:
+        pass
+    assert bnet.len() == 10
+    long_chain = Network.from_edges(zip(range(100000), range(1, 100001)))  # Far beyond the recursion limit
+    assert long_chain.len() == 100001
+    assert long_chain.collect(0, 100000) == [100000]
+
+    # A frozen network answers get and collect from compiled arrays, the same as from nodes
+    fnet = Network.from_edges([[rng.randrange(60), rng.randrange(60)] for _ in range(120)], [100])
+    fnet.add(101, [])
+    fnet.remove(rng.choice([name for name in range(60) if name in fnet._members]))
+    names = list(fnet._members)
+    expected = {name: [list(fnet.layers(name)), fnet.get(name)] for name in names}
+    fnet.freeze(on_change="raise")
+    assert {name: [list(fnet.layers(name)), fnet.get(name)] for name in names} == expected
+    fnet.collect(names[0], 0)
+    assert type(fnet._BFS_cache[names[0]]).__name__ == "_CSRLayers"
+    try:
+        fnet.add(102)
+        assert False
+    except RuntimeError:
+        pass
+    fnet.freeze()
+    fnet.add(102, [names[0]])
+    assert fnet.collect(102, 1) == [names[0]]
+    assert fnet.get(102) == [102, [names[0]], None]
+    fnet.unfreeze()
+    assert fnet._csr is None and fnet.collect(102, 1) == [names[0]]
+
+    # Saved networks load memory mapped and frozen, nodes are only created when changed
+    from tempfile import TemporaryDirectory
+    with TemporaryDirectory() as tmp:
+        fnet.change_member(102, weight_ch=0.25)
+        fnet.add("str", [102, 1.5], weight=3)
+        fnet.save(tmp)
+        expected = {name: [list(fnet.layers(name)), fnet.get(name)] for name in fnet._members}
+        lnet = Network.load(tmp)
+        assert lnet.len() == fnet.len() and lnet._members == {}
+        assert {name: [list(lnet.layers(name)), lnet.get(name)] for name in expected} == expected
+        try:
+            lnet.remove("str")
+            assert False
+        except RuntimeError:
+            pass
+        lnet = Network.load(tmp, mmap=False, on_change="rebuild")
+        lnet.remove("str")
+        assert lnet.len() == fnet.len() - 1 and lnet.get(102)[1] == [names[0]]
+        del lnet
+
+    # Concurrent readers get consistent results and nodes are left untouched
+    from threading import Thread
+    expected = [tnet.collect(source, 1) for source in [1, 2, 3, 4, 5, 6, 7, 8]]
+    failures = []
+    def reader():
+        for _ in range(200):
+            for source, layer in zip([1, 2, 3, 4, 5, 6, 7, 8], expected):
+                if tnet.collect(source, 1) != layer:
+                    failures.append(source)
+    readers = [Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    assert failures == []
+
+    # Unchecked changes give the same network as checked ones, existing members are still rejected
+    unet = Network()
+    for name, neighbours in [[1, [2, 3]], [4, [2]], [5, [3]], [6, [3]], [8, [4]], [7, [6]]]:
+        unet.unchecked_add(name, neighbours)
+    assert [unet.collect(2, k) for k in range(5)] == [tnet.collect(2, k) for k in range(5)]
+    try:
+        unet.unchecked_add(4)
+        assert False
+    except NameError:
+        pass
+    unet.unchecked_change_member(8, 9, [4, 10])
+    unet.unchecked_remove(10)
+    assert unet.get(9) == [9, [4], None] and unet.len() == 8
+
+    # Member index stays in sync with renames and removals
+    tnet.change_member(8, name_ch=9)
+    assert tnet.get(9) == [9, [4], None]
+    try:
+        tnet.get(8)
+    except NameError:
+        pass
+    try:
+        tnet.change_member(9, name_ch=4)
+    except NameError:
+        pass
+    tnet.remove(9)
+    assert tnet.get(4) == [4, [2], None]
+    tnet.add(9, [4])
+    assert tnet.len() == 8
+    assert tnet.collect(2, 2) == [3, 9]
+
 # ----------- MatchMake and SurveyRes with Network Unit test  -------
     from SurvMatch import SurveyRes, MatchMake
     from random import randint
@@ -97,5 +311,89 @@ def main():
 
     patnet.match_fill(match)
 
+    # Sparse match_fill links each target once but keeps the distances from source
+    many = [SurveyRes(i) for i in range(60)]
+    for i, surv in enumerate(many):
+        for j in range(len(questions)):
+            surv.add(questions[j], answers[(i % 3) + j], weights[j])  # Three groups of equal answers
+    bigmatch = MatchMake()
+    bigmatch.create_match(psurv, many)
+    for buckets in (None, 2):
+        densenet = Network()
+        densenet.match_fill(bigmatch, buckets=buckets)
+        sparsenet = Network()
+        sparsenet.match_fill(bigmatch, sparse=True, buckets=buckets)
+        assert [sorted(layer) for _, layer in densenet.layers("Pat.")] == \
+               [sorted(layer) for _, layer in sparsenet.layers("Pat.")]
+        assert sum(len(sparsenet.get(i)[1]) for i in range(60)) + len(sparsenet.get("Pat.")[1]) == 2 * 60
+        assert sparsenet.get(7)[2] == bigmatch._score_list[7].match_score
+    assert len(list(sparsenet.layers("Pat."))) <= 3
+
+    # Weighted distance in a match_fill network is 1 - match score, the same for dense and sparse links
+    scores = {m.match_target: m.match_score for m in bigmatch._score_list}
+    levels = sorted(set(scores.values()), reverse=True)
+    radius = 1 - (levels[0] + levels[1]) / 2  # Between the two best scores
+    for sparse in (False, True):
+        weighted = Network()
+        weighted.match_fill(bigmatch, sparse=sparse)
+        near = weighted.within("Pat.", radius)
+        assert sorted(name for name, _ in near) == sorted(name for name in scores if scores[name] == levels[0])
+        assert all(abs(distance - (1 - scores[name])) < 1e-9 for name, distance in near)
+        nearest = weighted.k_nearest("Pat.", len(near) + 3)
+        assert nearest[:len(near)] == near and [scores[name] for name, _ in nearest[len(near):]] == [levels[1]] * 3
+        assert [distance for _, distance in weighted.k_nearest("Pat.", 100, cost=lambda a, b: 1)] == \
+               [k for k, layer in weighted.layers("Pat.") for _ in layer][1:]
+        weighted.freeze()
+        assert weighted.within("Pat.", radius) == near and weighted.k_nearest("Pat.", 7) == nearest[:7]
+    try:
+        weighted.within("Pat.", 0.5, cost=lambda a, b: -1)
+        assert False
+    except ValueError:
+        pass
+
+    # Saved match results load memory mapped and fill a network directly
+    with TemporaryDirectory() as tmp:
+        bigmatch.save(tmp)
+        loaded = MatchMake.load(tmp)
+        assert [[m.match_target, m.match_score] for m in loaded._score_list] == \
+               [[m.match_target, m.match_score] for m in bigmatch._score_list]
+        loadnet = Network()
+        loadnet.match_fill(loaded, sparse=True, buckets=2)
+        assert [sorted(layer) for _, layer in loadnet.layers("Pat.")] == \
+               [sorted(layer) for _, layer in sparsenet.layers("Pat.")]
+        del loaded
+
+    # Buckets are equally wide also for scores outside [0,1], a perfect match shares the top bucket
+    bsurveys = []
+    for name, equal in (("S.", "abc"), ("T1.", "b"), ("T2.", "c"), ("T3.", "ab"), ("T4.", "abc")):
+        surv = SurveyRes(name)
+        for question, value in zip("abc", (2, 1, -1)):
+            surv.add(question, 1 if question in equal else 2, value)
+        bsurveys.append(surv)
+    bmatch = MatchMake()
+    bmatch.create_match(bsurveys[0], bsurveys[1:])
+    assert [m.match_score for m in bmatch._score_list] == [0.5, -0.5, 1.5, 1.0]
+    bnet = Network()
+    bnet.match_fill(bmatch, buckets=1)
+    assert [sorted(layer) for _, layer in bnet.layers("S.")] == [["S."], ["T3."], ["T1.", "T4."], ["T2."]]
+
+    pool = [psurv, tsurv1, tsurv2, tsurv3, tsurv4, tsurv5, tsurv6]
+    for top in MatchMake.match_all(pool, k=2):
+        topnet = Network()
+        topnet.match_fill(top)
+        assert topnet.len() == 3
+
+    # Importing network loads neither SurvMatch nor numpy, only the methods needing them do, and the import takes
+    # milliseconds
+    import subprocess, sys
+    from os.path import abspath, dirname
+    code = ("import sys, time; start = time.perf_counter(); import network; elapsed = time.perf_counter() - start; "
+            "print(elapsed, [name for name in ('SurvMatch', 'numpy') if name in sys.modules])")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=dirname(abspath(__file__)))
+    elapsed, loaded = result.stdout.split(" ", 1)
+    assert loaded.strip() == "[]"
+    assert float(elapsed) < 0.5  # Generous for slow machines without cached bytecode, numpy alone took 0.1 s
+
 
-if __name__ == '__main__': main()
\ No newline at end of file
+if __name__ == '__main__': main()
@@ -0,0 +1,54 @@
+# Koray Amico Kulbay, instrumentation, unit test
+
+from network import Network
+from profiling import Stats, instrument, uninstrument
+from SurvMatch import SurveyRes, MatchMake
+
+def main():
+    """Unit testing."""
+    calls = []
+    stats = Stats(callback=lambda name, seconds: calls.append(name))
+    net = Network()
+    instrument(net, stats)
+    net.add(1, [2, 3])  # Adds 2 and 3 as missing neighbours, counted as part of this add
+    net.add(4, [2])
+    assert net.collect(1, 2) == [4]
+    assert net.collect(1, 1) == [2, 3]
+    snapshot = stats.snapshot()
+    assert {name: call["count"] for name, call in snapshot["calls"].items()} == {"Network.add": 2,
+                                                                                 "Network.collect": 2}
+    assert calls == ["Network.add", "Network.add", "Network.collect", "Network.collect"]
+    counters = snapshot["counters"]
+    assert counters["Network.links_added"] == 3
+    assert counters["Network.cache_misses"] == 1 and counters["Network.cache_hits"] == 1
+    assert counters["Network.nodes_searched"] == 3  # Members found beyond source
+    assert counters["Network._get"] > 0
+
+    surveys = [SurveyRes(name) for name in ["Pat.", "Th1.", "Th2."]]
+    for i, surv in enumerate(surveys):
+        surv.add("quest1", i % 2, 5)
+        surv.add("quest2", 1, 2)
+    match = MatchMake()
+    instrument(match, stats)
+    match.create_match(surveys[0], surveys[1:])
+    net.match_fill(match)
+    counters = stats.snapshot()["counters"]
+    assert [counters["MatchMake.targets"], counters["MatchMake.questions"], counters["MatchMake.matches"]] == [2, 4, 2]
+    assert counters["Network.links_added"] == 3 + 2
+    assert stats.snapshot()["calls"]["Network.match_fill"]["count"] == 1
+    assert "Network.add" not in calls[4:]  # Adds made by match_fill are part of it
+
+    # Uninstrumented instances record nothing
+    uninstrument(net)
+    stats.reset()
+    net.collect(1, 1)
+    assert stats.snapshot() == {"calls": {}, "counters": {}}
+    assert "collect" not in vars(net) and Network().collect.__func__ is Network.collect
+    try:
+        instrument(surveys[0], stats)
+        assert False
+    except TypeError:
+        pass
+
+
+if __name__ == '__main__': main()